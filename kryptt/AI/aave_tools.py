@@ -1,43 +1,159 @@
-from ape import Contract, accounts, networks, project
-from traderjoe_tools import find_arbitrage, load_router_contract, load_token_contracts, impersonate_account
+from dataclasses import replace
+from datetime import datetime, timedelta
+from ape import project
+from eth_abi import encode
+from amm import ZERO_ADDRESS, get_amounts_out
+from arbitrage_graph import DEX_ROUTERS
+from arbitrage_scanner import scan_pairs
+from gas_oracle import estimate_swap_gas
+from traderjoe_tools import impersonate_account
+from token_cache import get_contract
+from fork_session import FORK
 
 AAVE_LENDING_POOL_ADDRESS = "0x794a61358D6845594F94dc1DB02A252b5b4814aD"  # Avalanche Mainnet
-FLASH_LOAN_AMOUNT = 10_000  # 10,000 tokens with 18 decimals
+FLASH_LOAN_PREMIUM_BPS = 5  # Aave V3 charges 0.05% on flash loans
+FLASH_LOAN_GAS = 150_000  # Flash loan overhead on top of the swaps
+ROUTE_ABI_TYPES = ["(address,address[])[]", "uint256", "uint256"]  # (swaps, minProfit, deadline)
+
+# The part of the Aave V3 pool interface read before borrowing
+AAVE_POOL_ABI = [
+    {"type": "function", "name": "getReserveData", "stateMutability": "view",
+     "inputs": [{"name": "asset", "type": "address"}],
+     "outputs": [{"name": "", "type": "tuple", "components": [
+         {"name": "configuration", "type": "tuple", "components": [{"name": "data", "type": "uint256"}]},
+         {"name": "liquidityIndex", "type": "uint128"},
+         {"name": "currentLiquidityRate", "type": "uint128"},
+         {"name": "variableBorrowIndex", "type": "uint128"},
+         {"name": "currentVariableBorrowRate", "type": "uint128"},
+         {"name": "currentStableBorrowRate", "type": "uint128"},
+         {"name": "lastUpdateTimestamp", "type": "uint40"},
+         {"name": "id", "type": "uint16"},
+         {"name": "aTokenAddress", "type": "address"},
+         {"name": "stableDebtTokenAddress", "type": "address"},
+         {"name": "variableDebtTokenAddress", "type": "address"},
+         {"name": "interestRateStrategyAddress", "type": "address"},
+         {"name": "accruedToTreasury", "type": "uint128"},
+         {"name": "unbacked", "type": "uint128"},
+         {"name": "isolationModeTotalDebt", "type": "uint128"},
+     ]}]},
+]
+
+# The FlashLoanArbitrage contract deployed on the current fork, kept in its snapshot so it is deployed once
+_flash_loan_arbitrage = {}
+FORK.on_fork(_flash_loan_arbitrage.clear)
+
+def get_flash_loan_arbitrage(account):
+    """
+    The FlashLoanArbitrage contract owned by `account`, deployed the first time it is needed on a fork.
+
+    Must be called inside `FORK.use()`, before the tool call changes anything else.
+    """
+    if "address" not in _flash_loan_arbitrage:
+        contract = account.deploy(project.FlashLoanArbitrage, AAVE_LENDING_POOL_ADDRESS)
+        FORK.keep()
+        _flash_loan_arbitrage["address"] = contract.address
+        print("FlashLoanArbitrage contract deployed")
+    return project.FlashLoanArbitrage.at(_flash_loan_arbitrage["address"])
+
+def available_liquidity(asset: str) -> int:
+    """
+    The amount of `asset` the Aave pool can lend right now, which is the asset balance held by its aToken.
+
+    Returns:
+        int: The amount available to flash loan, 0 if the pool does not list the asset.
+    """
+    pool = get_contract(AAVE_LENDING_POOL_ADDRESS, abi=AAVE_POOL_ABI)
+    a_token = pool.getReserveData(asset).aTokenAddress
+    if a_token == ZERO_ADDRESS:
+        return 0
+    return get_contract(asset).balanceOf(a_token)
+
+def encode_route(opportunity, min_profit: int, deadline: int) -> bytes:
+    """
+    Encode an opportunity's swaps into the calldata FlashLoanArbitrage.executeOperation decodes.
+
+    Args:
+        opportunity: The Opportunity to trade.
+        min_profit (int): The profit, after the loan premium, below which the whole transaction reverts.
+        deadline (int): The deadline for the swaps.
+
+    Returns:
+        bytes: The ABI encoded route.
+    """
+    token_in, token_out = opportunity.token_in["address"], opportunity.token_out["address"]
+    swaps = [
+        (DEX_ROUTERS[opportunity.buy_dex], [token_in, token_out]),
+        (DEX_ROUTERS[opportunity.sell_dex], [token_out, token_in]),
+    ]
+    return encode(ROUTE_ABI_TYPES, [swaps, min_profit, deadline])
 
 def execute_flash_loan_arbitrage(token0_address: str, token1_address: str):
+    """
+    Find the best arbitrage between TraderJoe and SushiSwap for two tokens and trade it with an Aave flash loan.
+
+    The opportunity is found and sized off-chain from the pool reserves, and sized down to what Aave can
+    lend when it has less of the asset than that. The borrow, both swaps and the repayment then happen in
+    a single transaction, which reverts unless the route repays the loan with a profit covering the gas.
+    The FlashLoanArbitrage contract is only deployed once per fork.
+
+    Args:
+        token0_address (str): The contract address of the first token.
+        token1_address (str): The contract address of the second token.
+
+    Returns:
+        str: A message indicating the result of the flash loan arbitrage.
+    """
     try:
-        with networks.parse_network_choice("avalanche:mainnet-fork:foundry") as provider:
+        with FORK.use() as provider:
+            print("Searching for arbitrage...")
+            # Either token can be the one borrowed, and the sizing has to beat the loan premium
+            opportunities = scan_pairs(
+                [(token0_address, token1_address), (token1_address, token0_address)],
+                gas=estimate_swap_gas(swaps=2) + FLASH_LOAN_GAS,
+                min_rate=1 + FLASH_LOAN_PREMIUM_BPS / 10_000,
+            )
+            # Aave can only lend what its aToken holds, so larger opportunities are sized down to that. Profit is
+            # concave in the amount traded, so the capped amount is the most profitable one Aave can fund
+            liquidity, fundable = {}, []
+            for opportunity in opportunities:
+                asset = opportunity.token_in["address"]
+                if asset not in liquidity:
+                    liquidity[asset] = available_liquidity(asset)
+                if opportunity.amount_in > liquidity[asset]:
+                    amount_in = liquidity[asset]
+                    profit = int(get_amounts_out(amount_in, opportunity.path, opportunity.pairs)) - amount_in
+                    opportunity = replace(opportunity, amount_in=amount_in, profit=profit)
+                premium = opportunity.amount_in * FLASH_LOAN_PREMIUM_BPS // 10_000
+                if opportunity.amount_in > 0 and opportunity.net_profit > premium:
+                    fundable.append((opportunity, premium))
+            if not fundable:
+                return "No arbitrage opportunity found which is profitable within Aave's available liquidity"
+            opportunity, premium = max(fundable, key=lambda item: item[0].net_profit - item[1])
+            token = opportunity.token_in
+            print(f"Arbitrage opportunity found: {opportunity}")
+
             account = impersonate_account()
             print("Account Loaded...")
-            lending_pool = Contract(AAVE_LENDING_POOL_ADDRESS)
-            print("Lending Pool Contract loaded...")
-            router_contract = load_router_contract()
-            print("Router contract loaded...")
-            token0, token1 = load_token_contracts(token0_address, token1_address)
-            print("Tokens Loaded")
-            
-            # Deploy the FlashLoanArbitrage contract
-            flash_loan_arbitrage = account.deploy(project.FlashLoanArbitrage, AAVE_LENDING_POOL_ADDRESS)
-            print("FlashLoanArbitrage contract deployed")
-            
-            # Execute the flash loan
-            tx = flash_loan_arbitrage.requestFlashLoan(
-                token0['address'],
-                FLASH_LOAN_AMOUNT,
-                sender=account
-            )
 
-            # Check if arbitrage was successful
-            print("Searching for arbitrage...")
-            arbitrage_result = find_arbitrage(flash_loan_arbitrage, router_contract, token0, token1)
+            flash_loan_arbitrage = get_flash_loan_arbitrage(account)
+
+            deadline = int((datetime.now() + timedelta(minutes=5)).timestamp())
+            route = encode_route(opportunity, min_profit=opportunity.gas_cost, deadline=deadline)
 
-            if arbitrage_result:
-                # Withdraw profits from the contract
-                withdraw_tx = flash_loan_arbitrage.withdraw(token0['address'], sender=account)
-                profit = account.balance() - account.balance_before(withdraw_tx)
-                return f"Flash loan arbitrage executed successfully. Profit: {profit / 10**18} AVAX"
-            else:
-                return "No profitable arbitrage opportunity found"
+            # Borrow, trade the route and repay in one transaction
+            token_contract = get_contract(token["address"])
+            balance_before = token_contract.balanceOf(account.address)
+            tx = flash_loan_arbitrage.requestFlashLoan(token["address"], opportunity.amount_in, route, sender=account)
+            print(f"Flash loan executed. Transaction hash: {tx.txn_hash}")
+
+            # Withdraw profits from the contract
+            flash_loan_arbitrage.withdraw(token["address"], sender=account)
+            profit = token_contract.balanceOf(account.address) - balance_before
+            return (
+                f"Flash loan arbitrage executed successfully. Borrowed {opportunity.amount_in / 10**token['decimals']} "
+                f"{token['symbol']}, profit: {profit / 10**token['decimals']} {token['symbol']} "
+                f"(loan premium {premium / 10**token['decimals']} {token['symbol']}, gas used {tx.gas_used})"
+            )
 
     except Exception as e:
-        return f"Error executing flash loan arbitrage: {str(e)}"
\ No newline at end of file
+        return f"Error executing flash loan arbitrage: {str(e)}"
@@ -41,6 +41,7 @@ tools = [
             find_arbitrage_sushiswap_traderjoe_tool,
             find_arbitrage_sushiswap_tool,
             find_arbitrage_traderjoe_tool,
+            scan_arbitrage_tool,
             # Vectorbt Tools
             #predict_profit_tool,
             backtest_trading_indicators_tool,
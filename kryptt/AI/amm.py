@@ -0,0 +1,236 @@
+from dataclasses import dataclass
+import time
+import numpy as np
+from multicall import batch_call
+from token_cache import get_contract
+
+FEE_BPS = 30  # TraderJoe V1 and SushiSwap both charge 0.3% per swap
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+MISSING_PAIR_TTL = 300  # Seconds a pair the factory does not have is remembered, since it can be created later
+
+# The parts of the UniswapV2 factory and pair interfaces the pricing engine reads
+FACTORY_ABI = [
+    {"type": "function", "name": "getPair", "stateMutability": "view",
+     "inputs": [{"name": "tokenA", "type": "address"}, {"name": "tokenB", "type": "address"}],
+     "outputs": [{"name": "pair", "type": "address"}]},
+]
+PAIR_ABI = [
+    {"type": "function", "name": "getReserves", "stateMutability": "view", "inputs": [],
+     "outputs": [{"name": "reserve0", "type": "uint112"}, {"name": "reserve1", "type": "uint112"},
+                 {"name": "blockTimestampLast", "type": "uint32"}]},
+    {"type": "function", "name": "token0", "stateMutability": "view", "inputs": [],
+     "outputs": [{"name": "", "type": "address"}]},
+    {"type": "function", "name": "token1", "stateMutability": "view", "inputs": [],
+     "outputs": [{"name": "", "type": "address"}]},
+    {"type": "event", "name": "Sync", "anonymous": False,
+     "inputs": [{"name": "reserve0", "type": "uint112", "indexed": False},
+                {"name": "reserve1", "type": "uint112", "indexed": False}]},
+]
+
+# Immutable on-chain lookups, cached for the life of the process. Reads which failed are never cached
+_factories = {}  # router address -> factory contract
+_pair_addresses = {}  # (factory address, token_a, token_b) -> pair address
+_missing_pairs = {}  # (factory address, token_a, token_b) -> monotonic time until which the pair is known not to exist
+_pair_tokens = {}  # pair address -> (token0, token1)
+
+@dataclass
+class PairReserves:
+    """
+    The reserves of a constant-product pair at a given point in time.
+
+    Attributes:
+        address (str): The pair contract address.
+        token0 (str): The address of the pair's token0.
+        token1 (str): The address of the pair's token1.
+        reserve0 (int): The reserve of token0.
+        reserve1 (int): The reserve of token1.
+        fee_bps (int): The swap fee in basis points.
+    """
+    address: str
+    token0: str
+    token1: str
+    reserve0: int
+    reserve1: int
+    fee_bps: int = FEE_BPS
+
+    def reserves_for(self, token_in: str) -> tuple:
+        """
+        Returns:
+            tuple: The (reserve_in, reserve_out) of a swap selling `token_in` into the pair.
+        """
+        if token_in.lower() == self.token0.lower():
+            return self.reserve0, self.reserve1
+        return self.reserve1, self.reserve0
+
+def get_amount_out(amount_in, reserve_in: int, reserve_out: int, fee_bps: int = FEE_BPS):
+    """
+    The output of a constant-product swap, matching UniswapV2Library.getAmountOut to the wei.
+
+    Works on a single amount or on a NumPy array of amounts at once. Arrays use the object dtype so the
+    arithmetic stays in arbitrary-precision integers, since 18 decimal reserves overflow 64 bits.
+
+    Args:
+        amount_in (int | np.ndarray): The input amount or amounts.
+        reserve_in (int): The pair's reserve of the input token.
+        reserve_out (int): The pair's reserve of the output token.
+        fee_bps (int): The swap fee in basis points.
+
+    Returns:
+        int | np.ndarray: The output amount for each input amount.
+    """
+    amount_in_with_fee = amount_in * (10_000 - fee_bps)
+    numerator = amount_in_with_fee * reserve_out
+    denominator = reserve_in * 10_000 + amount_in_with_fee
+    return numerator // denominator
+
+def quote(amount: int, pair: PairReserves, token: str) -> int:
+    """
+    The value of `amount` of `token` in the pair's other token at the mid price, like UniswapV2Library.quote.
+    """
+    reserve_in, reserve_out = pair.reserves_for(token)
+    return amount * reserve_out // reserve_in
+
+def get_amounts_out(amount_in, path: list, pairs: list):
+    """
+    The output of a multi-hop swap along `path`, computed locally from the reserves of each hop's pair.
+
+    Args:
+        amount_in (int | np.ndarray): The input amount or amounts.
+        path (list): The token addresses of the swap path.
+        pairs (list): The PairReserves of each hop, in path order.
+
+    Returns:
+        int | np.ndarray: The final output amount for each input amount.
+    """
+    amount = np.asarray(amount_in, dtype=object) if isinstance(amount_in, (list, np.ndarray)) else amount_in
+    for token_in, pair in zip(path, pairs):
+        reserve_in, reserve_out = pair.reserves_for(token_in)
+        amount = get_amount_out(amount, reserve_in, reserve_out, pair.fee_bps)
+    return amount
+
+def get_factory(router_contract):
+    router_address = router_contract.address
+    if router_address not in _factories:
+        _factories[router_address] = get_contract(router_contract.factory(), abi=FACTORY_ABI)
+    return _factories[router_address]
+
+def get_pair_addresses(router_contract, token_pairs: list) -> list:
+    """
+    Look up the pair contracts of a router for many token pairs, reading only unknown pairs in one multicall.
+
+    Args:
+        router_contract: The router contract object.
+        token_pairs (list): Tuples of two token addresses.
+
+    Returns:
+        list: The pair address of each token pair, or None where the router has no pair.
+    """
+    factory = get_factory(router_contract)
+    now = time.monotonic()
+    keys = [(factory.address, *sorted((token_a.lower(), token_b.lower()))) for token_a, token_b in token_pairs]
+    missing = [
+        (key, token_pair) for key, token_pair in zip(keys, token_pairs)
+        if key not in _pair_addresses and _missing_pairs.get(key, 0) <= now
+    ]
+
+    results = batch_call([(factory.getPair, *token_pair) for _, token_pair in missing])
+    for (key, _), pair_address in zip(missing, results):
+        if pair_address == ZERO_ADDRESS:
+            _missing_pairs[key] = now + MISSING_PAIR_TTL
+        elif pair_address:
+            _pair_addresses[key] = pair_address
+    return [_pair_addresses.get(key) for key in keys]
+
+def fetch_reserves(pair_addresses: list) -> dict:
+    """
+    Read the current reserves of many pairs in a single multicall.
+
+    Args:
+        pair_addresses (list): The pair contract addresses.
+
+    Returns:
+        dict: The PairReserves of each pair keyed by pair address. Pairs which could not be read are left out.
+    """
+    pair_addresses = list(dict.fromkeys(address for address in pair_addresses if address))
+    pairs = [get_contract(address, abi=PAIR_ABI) for address in pair_addresses]
+
+    # token0 and token1 never change, so they are only read the first time a pair is seen
+    unknown = [pair for pair in pairs if pair.address not in _pair_tokens]
+    calls = [(pair.getReserves,) for pair in pairs]
+    calls += [call for pair in unknown for call in ((pair.token0,), (pair.token1,))]
+    results = batch_call(calls)
+
+    tokens = results[len(pairs):]
+    for i, pair in enumerate(unknown):
+        if tokens[2 * i] is not None and tokens[2 * i + 1] is not None:
+            _pair_tokens[pair.address] = (tokens[2 * i], tokens[2 * i + 1])
+
+    return {
+        pair.address: PairReserves(pair.address, *_pair_tokens[pair.address], reserves[0], reserves[1])
+        for pair, reserves in zip(pairs, results[:len(pairs)])
+        if reserves is not None and pair.address in _pair_tokens
+    }
+
+def fetch_path_reserves(router_contract, path: list) -> list | None:
+    """
+    Read the reserves of every hop of a swap path on a router, in at most two multicalls.
+
+    Args:
+        router_contract: The router contract object.
+        path (list): The token addresses of the swap path.
+
+    Returns:
+        list | None: The PairReserves of each hop in path order, or None if a hop has no pair or liquidity.
+    """
+    pair_addresses = get_pair_addresses(router_contract, list(zip(path, path[1:])))
+    if None in pair_addresses:
+        return None
+    reserves = fetch_reserves(pair_addresses)
+    pairs = [reserves.get(address) for address in pair_addresses]
+    if any(pair is None or pair.reserve0 == 0 or pair.reserve1 == 0 for pair in pairs):
+        return None
+    return pairs
+
+def optimal_amount_in(reserves_in, reserves_out, fee_bps=FEE_BPS, min_rate: float = 1.0) -> tuple:
+    """
+    The profit-maximizing input of many routes at once, in closed form.
+
+    The hops of a route are folded into one virtual constant-product pool with reserves (Ea, Eb), whose
+    output for an input x is γ·x·Eb / (Ea + γ·x). Maximizing output − min_rate·x then gives
+    x* = (sqrt(γ·Ea·Eb / min_rate) − Ea) / γ, which is only positive when the route is profitable at the margin.
+
+    The input and output of a route must be in the same unit, e.g. a cycle back to the starting token. Floats
+    are used throughout, so the result should be re-checked with the exact integer `get_amounts_out`.
+
+    Args:
+        reserves_in (array-like): The reserve of the input token of each hop, shaped (routes, hops).
+        reserves_out (array-like): The reserve of the output token of each hop, shaped (routes, hops).
+        fee_bps (int | array-like): The swap fee of each hop in basis points, broadcast to (routes, hops).
+        min_rate (float): The return per unit put in the trade has to beat, e.g. 1.01 to require 1% on top.
+
+    Returns:
+        tuple: The optimal input amount and its expected profit over `min_rate` of each route, as float arrays.
+            Both are 0 for routes without an opportunity.
+    """
+    reserves_in = np.asarray(reserves_in, dtype=float)
+    reserves_out = np.asarray(reserves_out, dtype=float)
+    gamma = 1 - np.broadcast_to(fee_bps, reserves_in.shape) / 10_000
+
+    virtual_in, virtual_out = reserves_in[:, 0], reserves_out[:, 0]
+    for hop in range(1, reserves_in.shape[1]):
+        denominator = reserves_in[:, hop] + gamma[:, hop] * virtual_out
+        virtual_in = virtual_in * reserves_in[:, hop] / denominator
+        virtual_out = gamma[:, hop] * virtual_out * reserves_out[:, hop] / denominator
+
+    gamma_in = gamma[:, 0]
+    amount_in = np.maximum((np.sqrt(gamma_in * virtual_in * virtual_out / min_rate) - virtual_in) / gamma_in, 0.0)
+    amount_out = gamma_in * amount_in * virtual_out / (virtual_in + gamma_in * amount_in)
+    return amount_in, amount_out - min_rate * amount_in
+
+def route_reserves(path: list, pairs: list) -> tuple:
+    """
+    Returns:
+        tuple: The (reserves_in, reserves_out) of each hop of a route, in path order.
+    """
+    reserves = [pair.reserves_for(token_in) for token_in, pair in zip(path, pairs)]
+    return [reserve_in for reserve_in, _ in reserves], [reserve_out for _, reserve_out in reserves]
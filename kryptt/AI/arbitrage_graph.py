@@ -0,0 +1,187 @@
+from dataclasses import dataclass
+from itertools import combinations
+import math
+import numpy as np
+from amm import fetch_reserves, get_amounts_out, get_pair_addresses, optimal_amount_in, route_reserves
+from token_cache import AVALANCHE_CHAIN_ID, COMMON_TOKENS
+from traderjoe_sushiswap import TRADERJOE_ROUTER, SUSHISWAP_ROUTER
+from traderjoe_tools import load_router_contract
+
+# The DEXes whose pairs make up the token graph, by router
+DEX_ROUTERS = {
+    "TraderJoe": TRADERJOE_ROUTER,
+    "SushiSwap": SUSHISWAP_ROUTER,
+}
+WATCHLIST_TOKENS = [token["address"] for token in COMMON_TOKENS[AVALANCHE_CHAIN_ID]]
+MIN_CYCLE_HOPS = 2
+MAX_CYCLE_HOPS = 4
+
+@dataclass
+class ArbitrageCycle:
+    """
+    A cycle of swaps which returns more of the starting token than it puts in, at the margin.
+
+    Attributes:
+        path (list): The token addresses of the cycle, starting and ending with the same token.
+        dexes (list): The DEX of each hop.
+        pairs (list): The PairReserves of each hop.
+        rate (float): The marginal amount of the starting token returned per unit put in, after fees.
+        amount_in (int): The profit-maximizing amount of the starting token to put in.
+        profit (int): The profit of trading `amount_in`, in the starting token.
+    """
+    path: list
+    dexes: list
+    pairs: list
+    rate: float
+    amount_in: int = 0
+    profit: int = 0
+
+    @property
+    def hops(self) -> int:
+        return len(self.pairs)
+
+class ArbitrageGraph:
+    """
+    A directed token graph over the pairs of several DEXes, searched for profitable swap cycles.
+
+    Every pair contributes one edge per direction, weighted by the negative log of its marginal exchange
+    rate after fees, so a profitable cycle is a cycle of negative total weight. The pairs are discovered
+    once, after which `refresh()` re-reads all reserves in a single multicall and `find_cycles()` runs a
+    hop-bounded Bellman-Ford from every token at once, vectorized in NumPy.
+
+    Args:
+        tokens (list): The token addresses making up the graph.
+        routers (dict): The router address of each DEX, keyed by DEX name.
+    """
+
+    def __init__(self, tokens: list = WATCHLIST_TOKENS, routers: dict = DEX_ROUTERS):
+        self.tokens = list(tokens)
+        self._token_index = {token.lower(): i for i, token in enumerate(self.tokens)}
+        self.pair_dexes = {}  # pair address -> DEX name
+        self.pairs = {}  # pair address -> PairReserves, as of the last refresh
+
+        token_pairs = list(combinations(self.tokens, 2))
+        for dex, router_address in routers.items():
+            router_contract = load_router_contract(router_address=router_address)
+            for pair_address in get_pair_addresses(router_contract, token_pairs):
+                if pair_address is not None:
+                    self.pair_dexes[pair_address] = dex
+
+    def refresh(self, pairs: dict = None):
+        """
+        Update the edge weights from the current reserves.
+
+        Args:
+            pairs (dict, optional): Reserves already known, keyed by pair address, e.g. from Sync events.
+                Defaults to reading every pair of the graph in a single multicall.
+        """
+        self.pairs.update(pairs if pairs is not None else fetch_reserves(list(self.pair_dexes)))
+
+        edges = []  # (token_in index, token_out index, pair address, weight)
+        for address, pair in self.pairs.items():
+            if address not in self.pair_dexes or pair.reserve0 == 0 or pair.reserve1 == 0:
+                continue
+            index0, index1 = self._token_index[pair.token0.lower()], self._token_index[pair.token1.lower()]
+            # Reserves can exceed 64 bits, so their logs are taken on the Python integers
+            log_reserve0, log_reserve1 = math.log(pair.reserve0), math.log(pair.reserve1)
+            fee = math.log1p(-pair.fee_bps / 10_000)
+            edges.append((index0, index1, address, log_reserve0 - log_reserve1 - fee))
+            edges.append((index1, index0, address, log_reserve1 - log_reserve0 - fee))
+
+        self._edge_src = np.array([edge[0] for edge in edges], dtype=np.int64)
+        self._edge_dst = np.array([edge[1] for edge in edges], dtype=np.int64)
+        self._edge_pairs = [edge[2] for edge in edges]
+        # A trailing edge of infinite weight pads every token's list of incoming edges to the same length
+        self._edge_weight = np.append([edge[3] for edge in edges], np.inf)
+
+        incoming = [np.flatnonzero(self._edge_dst == i) for i in range(len(self.tokens))]
+        max_degree = max((len(edge_ids) for edge_ids in incoming), default=0)
+        self._incoming = np.full((len(self.tokens), max(max_degree, 1)), len(edges), dtype=np.int64)
+        for i, edge_ids in enumerate(incoming):
+            self._incoming[i, :len(edge_ids)] = edge_ids
+
+    def find_cycles(self, max_hops: int = MAX_CYCLE_HOPS, min_rate: float = 1.0) -> list:
+        """
+        Find the best cycle through every token for each length from MIN_CYCLE_HOPS to `max_hops`.
+
+        Args:
+            max_hops (int): The maximum number of swaps in a cycle.
+            min_rate (float): The minimum marginal rate of a cycle, e.g. 1.001 for 0.1% after fees.
+
+        Returns:
+            list: The ArbitrageCycles found and sized, best rate first.
+        """
+        if not self._edge_pairs:
+            return []
+
+        n = len(self.tokens)
+        src = np.append(self._edge_src, 0)[self._incoming]  # (tokens, max degree) source token of each incoming edge
+        weight = self._edge_weight[self._incoming]
+
+        # dist[s, v] is the lightest walk of exactly k hops from s to v, and pred[k][s, v] its last edge
+        dist = np.full((n, n), np.inf)
+        dist[np.arange(n), np.arange(n)] = 0.0
+        pred = []
+        threshold = -np.log(min_rate)
+
+        cycles = {}
+        for hops in range(1, max_hops + 1):
+            candidates = dist[:, src] + weight  # (sources, tokens, max degree)
+            best = np.argmin(candidates, axis=2)
+            dist = np.take_along_axis(candidates, best[..., None], axis=2)[..., 0]
+            pred.append(self._incoming[np.arange(n), best])
+
+            if hops < MIN_CYCLE_HOPS:
+                continue
+            for start in np.flatnonzero(np.diagonal(dist) < threshold):
+                cycle = self._build_cycle(pred, start, hops)
+                if cycle is not None:
+                    # The same cycle is found once from each of its tokens
+                    key = frozenset(zip(cycle.path, cycle.path[1:], (pair.address for pair in cycle.pairs)))
+                    cycles.setdefault(key, cycle)
+
+        cycles = list(cycles.values())
+        size_cycles(cycles)
+        return sorted(cycles, key=lambda cycle: cycle.rate, reverse=True)
+
+    def _build_cycle(self, pred: list, start: int, hops: int) -> ArbitrageCycle | None:
+        edge_ids = []
+        token = start
+        for k in range(hops - 1, -1, -1):
+            edge_id = pred[k][start, token]
+            edge_ids.append(edge_id)
+            token = self._edge_src[edge_id]
+        edge_ids.reverse()
+
+        path = [int(self._edge_src[edge_id]) for edge_id in edge_ids] + [start]
+        # Walks revisiting a token are a shorter cycle plus a detour, which is found on its own
+        if len(set(path[:-1])) != hops:
+            return None
+
+        pairs = [self.pairs[self._edge_pairs[edge_id]] for edge_id in edge_ids]
+        return ArbitrageCycle(
+            path=[self.tokens[i] for i in path],
+            dexes=[self.pair_dexes[pair.address] for pair in pairs],
+            pairs=pairs,
+            rate=float(np.exp(-self._edge_weight[edge_ids].sum())),
+        )
+
+def size_cycles(cycles: list):
+    """
+    Set the profit-maximizing `amount_in` and its exact `profit` on every cycle, solving cycles of the same
+    length together in one vectorized call.
+
+    Args:
+        cycles (list): The ArbitrageCycles to size.
+    """
+    for hops in {cycle.hops for cycle in cycles}:
+        group = [cycle for cycle in cycles if cycle.hops == hops]
+        routes = [route_reserves(cycle.path, cycle.pairs) for cycle in group]
+        amounts_in, _ = optimal_amount_in(
+            [reserves_in for reserves_in, _ in routes],
+            [reserves_out for _, reserves_out in routes],
+            [[pair.fee_bps for pair in cycle.pairs] for cycle in group],
+        )
+        for cycle, amount_in in zip(group, amounts_in):
+            cycle.amount_in = int(amount_in)
+            cycle.profit = int(get_amounts_out(cycle.amount_in, cycle.path, cycle.pairs)) - cycle.amount_in
@@ -0,0 +1,199 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import time
+from amm import fetch_reserves, get_amounts_out, get_pair_addresses, optimal_amount_in, quote, route_reserves
+from arbitrage_graph import DEX_ROUTERS
+from fork_session import FORK
+from gas_oracle import GAS_ORACLE, estimate_swap_gas
+from simulation import WAVAX_ADDRESS
+from token_cache import get_token_metadata
+from traderjoe_tools import load_router_contract
+
+SCANNER_WORKERS = 4  # Shards read concurrently, raise until the RPC endpoint is saturated
+SHARD_SIZE = 50  # Token pairs per shard, each shard costs one multicall per router plus one for the reserves
+MAX_RESULTS = 10
+
+@dataclass
+class Opportunity:
+    """
+    A cross-DEX arbitrage: buy `token_out` with `token_in` on one DEX and sell it back on the other.
+
+    Attributes:
+        token_in (dict): The address, symbol and decimals of the token the trade starts and ends with.
+        token_out (dict): The address, symbol and decimals of the token bought and sold.
+        buy_dex (str): The DEX `token_out` is bought on.
+        sell_dex (str): The DEX `token_out` is sold on.
+        pairs (list): The PairReserves of the buy and the sell pair.
+        amount_in (int): The profit-maximizing amount of `token_in` to trade.
+        profit (int): The profit of trading `amount_in` before gas, in `token_in`.
+        gas_cost (int): The gas cost of both swaps, in `token_in`.
+    """
+    token_in: dict
+    token_out: dict
+    buy_dex: str
+    sell_dex: str
+    pairs: list
+    amount_in: int
+    profit: int
+    gas_cost: int
+
+    @property
+    def net_profit(self) -> int:
+        return self.profit - self.gas_cost
+
+    @property
+    def path(self) -> list:
+        return [self.token_in["address"], self.token_out["address"], self.token_in["address"]]
+
+    @property
+    def return_pct(self) -> float:
+        return 100 * self.net_profit / self.amount_in
+
+    def __str__(self) -> str:
+        decimals = 10**self.token_in["decimals"]
+        return (
+            f"{self.token_in['symbol']} -> {self.token_out['symbol']} -> {self.token_in['symbol']}: "
+            f"buy on {self.buy_dex}, sell on {self.sell_dex}, trade {self.amount_in / decimals:.6f} "
+            f"{self.token_in['symbol']} for a profit of {self.net_profit / decimals:.6f} {self.token_in['symbol']} "
+            f"after {self.gas_cost / decimals:.6f} {self.token_in['symbol']} of gas ({self.return_pct:.3f}%)"
+        )
+
+def scan_shard(routers: dict, token_pairs: list, tokens: dict, gas_cost: int, min_rate: float = 1.0) -> list:
+    """
+    Find the opportunities of one shard of the watchlist.
+
+    Pairs are looked up with one multicall per router, their reserves read with a single multicall, and
+    every direction of every token pair solved in one vectorized call. The WAVAX pair of each starting
+    token is read on both DEXes in the same multicalls, so the gas cost is priced without extra requests and
+    candidates which do not cover it are dropped before anything downstream spends work on them. Starting
+    tokens without a WAVAX pair on either DEX cannot be priced and are reported and skipped.
+
+    Args:
+        routers (dict): The router contract of each DEX, keyed by DEX name. Exactly two DEXes are compared.
+        token_pairs (list): Tuples of two token addresses.
+        tokens (dict): The metadata of every token, keyed by lowercase address.
+        gas_cost (int): The gas cost of an arbitrage, in wei of the native token.
+        min_rate (float): The return per unit traded the sizing has to beat, e.g. to cover a flash loan premium.
+
+    Returns:
+        list: The Opportunities of the shard which are profitable after gas.
+    """
+    (dex_a, router_a), (dex_b, router_b) = routers.items()
+    native_pairs = [(WAVAX_ADDRESS, token_in) for token_in in dict.fromkeys(token_in for token_in, _ in token_pairs)]
+    pair_addresses_a = get_pair_addresses(router_a, token_pairs + native_pairs)
+    pair_addresses_b = get_pair_addresses(router_b, token_pairs + native_pairs)
+    reserves = fetch_reserves(pair_addresses_a + pair_addresses_b)
+
+    # The gas cost of each starting token, priced on whichever DEX has its WAVAX pair
+    gas_costs, unpriced = {}, []
+    native_addresses = zip(pair_addresses_a[len(token_pairs):], pair_addresses_b[len(token_pairs):])
+    for (_, token_in), (address_a, address_b) in zip(native_pairs, native_addresses):
+        native_pair = reserves.get(address_a) or reserves.get(address_b)
+        if token_in.lower() == WAVAX_ADDRESS.lower():
+            gas_costs[token_in] = gas_cost
+        elif native_pair is not None:
+            gas_costs[token_in] = quote(gas_cost, native_pair, WAVAX_ADDRESS)
+        else:
+            unpriced.append(token_in)
+    if unpriced:
+        print(f"Skipping tokens without a WAVAX pair to price the gas with: {', '.join(unpriced)}")
+    pair_addresses_a, pair_addresses_b = pair_addresses_a[:len(token_pairs)], pair_addresses_b[:len(token_pairs)]
+
+    candidates = []
+    for (token_in, token_out), address_a, address_b in zip(token_pairs, pair_addresses_a, pair_addresses_b):
+        pair_a, pair_b = reserves.get(address_a), reserves.get(address_b)
+        if pair_a is None or pair_b is None or gas_costs.get(token_in) is None:
+            continue
+        candidates.append((token_in, token_out, dex_a, dex_b, [pair_a, pair_b]))
+        candidates.append((token_in, token_out, dex_b, dex_a, [pair_b, pair_a]))
+    if not candidates:
+        return []
+
+    routes = [route_reserves([token_in, token_out, token_in], pairs) for token_in, token_out, _, _, pairs in candidates]
+    amounts_in, _ = optimal_amount_in(
+        [reserves_in for reserves_in, _ in routes],
+        [reserves_out for _, reserves_out in routes],
+        [[pair.fee_bps for pair in pairs] for *_, pairs in candidates],
+        min_rate,
+    )
+
+    opportunities = []
+    for (token_in, token_out, buy_dex, sell_dex, pairs), amount_in in zip(candidates, amounts_in):
+        amount_in = int(amount_in)
+        if amount_in == 0:
+            continue
+        # The solver works in floats, so the profit is re-computed with the exact integer swap math
+        profit = int(get_amounts_out(amount_in, [token_in, token_out, token_in], pairs)) - amount_in
+        if profit > gas_costs[token_in]:
+            opportunities.append(Opportunity(
+                tokens[token_in.lower()], tokens[token_out.lower()], buy_dex, sell_dex, pairs, amount_in, profit,
+                gas_costs[token_in],
+            ))
+    return opportunities
+
+def scan_pairs(token_pairs: list, workers: int = SCANNER_WORKERS, routers: dict = DEX_ROUTERS, gas: int = None,
+               min_rate: float = 1.0) -> list:
+    """
+    Scan a watchlist of token pairs for cross-DEX arbitrage in one call.
+
+    The watchlist is split into shards which a thread pool reads concurrently. The workers share the one
+    provider and its connection pool, and the process-wide token, contract and pair caches, so each token
+    and pair is only ever looked up once. Pairs with a token whose symbol or decimals cannot be read are
+    skipped.
+
+    Args:
+        token_pairs (list): Tuples of two token addresses.
+        workers (int): The number of shards read at the same time.
+        routers (dict): The router address of each DEX, keyed by DEX name.
+        gas (int, optional): The gas of executing an opportunity. Defaults to two router swaps.
+        min_rate (float): The return per unit traded the sizing has to beat.
+
+    Returns:
+        list: The Opportunities which are profitable after gas, highest return first.
+    """
+    token_pairs = [tuple(token_pair) for token_pair in token_pairs]
+    addresses = list(dict.fromkeys(address for token_pair in token_pairs for address in token_pair))
+    tokens = {
+        token["address"].lower(): token for token in get_token_metadata(addresses)
+        if token["symbol"] is not None and token["decimals"] is not None
+    }
+    # Tokens whose symbol or decimals could not be read cannot be priced or reported, so their pairs are skipped
+    unknown = [address for address in addresses if address.lower() not in tokens]
+    if unknown:
+        print(f"Skipping pairs of tokens without metadata: {', '.join(unknown)}")
+        token_pairs = [
+            token_pair for token_pair in token_pairs if all(address.lower() in tokens for address in token_pair)
+        ]
+    router_contracts = {dex: load_router_contract(router_address=address) for dex, address in routers.items()}
+    gas_cost = GAS_ORACLE.gas_cost(gas if gas is not None else estimate_swap_gas(swaps=2))
+
+    shards = [token_pairs[i:i + SHARD_SIZE] for i in range(0, len(token_pairs), SHARD_SIZE)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(lambda shard: scan_shard(router_contracts, shard, tokens, gas_cost, min_rate), shards)
+        opportunities = [opportunity for shard_opportunities in results for opportunity in shard_opportunities]
+
+    return sorted(opportunities, key=lambda opportunity: opportunity.return_pct, reverse=True)
+
+def scan_arbitrage(token_pairs: list, max_results: int = MAX_RESULTS):
+    """
+    Scan many token pairs for arbitrage between TraderJoe and SushiSwap on the Avalanche network.
+
+    Args:
+        token_pairs (list): Pairs of token contract addresses.
+        max_results (int): The number of opportunities to report.
+
+    Returns:
+        str: The best opportunities found, ranked by return after gas.
+    """
+    try:
+        with FORK.use() as provider:
+            start = time.perf_counter()
+            opportunities = scan_pairs(token_pairs)
+            elapsed = time.perf_counter() - start
+
+        if not opportunities:
+            return f"No arbitrage opportunities found across {len(token_pairs)} pairs ({elapsed:.2f}s)"
+        ranked = "\n".join(f"{rank}. {opportunity}" for rank, opportunity in enumerate(opportunities[:max_results], 1))
+        return f"Found {len(opportunities)} arbitrage opportunities across {len(token_pairs)} pairs ({elapsed:.2f}s):\n{ranked}"
+    except Exception as e:
+        return f"Error occurred in scan_arbitrage: {str(e)}"
@@ -0,0 +1,292 @@
+"""
+Benchmarks for the DEX tools against a local anvil chain, so their cost can be measured without a live network.
+
+Deploys the mock UniswapV2 token, factory, pair and router contracts from contracts/mocks as a "TraderJoe"
+and a "SushiSwap" DEX, seeds both with liquidity between a handful of tokens (with a few pools mispriced so
+there is something to find), and then measures for each tool:
+
+- RPC requests per quote or per detection, counted on the provider,
+- quotes per second,
+- end-to-end arbitrage detection latency, through the same entry points the agent's tools call.
+
+WAVAX is placed at its mainnet address, since the tools route through it, and the account the tools
+impersonate is funded with the USDC every detection starts from. Every benchmark runs on a snapshot of the seeded chain which is
+reverted afterwards, so runs are independent of each other.
+
+Run from kryptt/AI with `python benchmark_dex_tools.py`. Pass --save to write the results to
+BASELINE_FILE as the regression baseline, or --compare to print the change against the saved baseline.
+The run fails if any detection takes longer than STALL_SECONDS.
+"""
+import json
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from itertools import combinations
+from pathlib import Path
+import numpy as np
+from ape import accounts, chain, networks, project
+from ape_ethereum import multicall
+import token_cache
+from simulation import _clear_allowances
+from amm import fetch_path_reserves, get_amounts_out
+from arbitrage_graph import ArbitrageGraph
+from arbitrage_scanner import scan_pairs
+from multicall import quote_amounts_out
+from sushiswap_tools import find_arbitrage_sushiswap
+from traderjoe_sushiswap import check_prices, find_arbitrage_sushiswap_traderjoe
+from traderjoe_tools import NATIVE_TOKEN_ADDRESS, find_arbitrage_traderjoe, impersonate_account
+
+# web3 v7 replaced function middleware with classes, whose base class passes requests through unchanged
+try:
+    from web3.middleware import Web3Middleware
+except ImportError:
+    Web3Middleware = None
+
+LOCAL_NETWORK = "ethereum:local:foundry"
+BASELINE_FILE = Path(__file__).parent / "benchmark_baseline.json"
+QUOTES = 200  # Quotes per quoting benchmark
+REPEATS = 5  # Runs per detection benchmark, the median is reported
+STALL_SECONDS = 5  # A detection slower than this on the local chain is waiting on the chain rather than working
+LIQUIDITY = 1_000_000 * 10**18  # Reserve of each token in a balanced pool
+# USDC held by the trading account, which every detection starts from. Kept to a small share of a pool, since
+# the cross-DEX tool sells its whole balance of the bought token back
+TRADING_BALANCE = 10_000 * 10**18
+TOKEN_SYMBOLS = ["USDC", "USDT", "DAI", "WETH", "WBTC"]
+# Pools deliberately mispriced on SushiSwap, as (symbol, symbol, reserve multiplier of the second token)
+MISPRICED_POOLS = [("USDC", "USDT", 1.02), ("DAI", "WETH", 0.97), ("WAVAX", "WBTC", 1.05)]
+
+@dataclass
+class BenchmarkResult:
+    """
+    Attributes:
+        name (str): The tool and operation measured.
+        operations (int): The number of quotes or detections measured.
+        seconds (float): The wall time of all operations.
+        rpc_requests (int): The RPC requests made by all operations.
+    """
+    name: str
+    operations: int
+    seconds: float
+    rpc_requests: int
+
+    @property
+    def per_second(self) -> float:
+        return self.operations / self.seconds if self.seconds else float("inf")
+
+    @property
+    def latency_ms(self) -> float:
+        return 1000 * self.seconds / self.operations
+
+    @property
+    def rpc_per_operation(self) -> float:
+        return self.rpc_requests / self.operations
+
+class RpcCounter:
+    """
+    Counts the RPC requests made through the connected provider, by method.
+
+    Both web3's middleware stack and ape's direct requests end in the web3 provider's `make_request`, so that
+    is where requests are counted. A pass-through middleware is added alongside, which makes web3 rebuild its
+    cached request function on top of the counting one.
+    """
+
+    def __init__(self):
+        self.requests = {}
+
+    def __enter__(self):
+        self._web3 = chain.provider.web3
+        self._make_request = self._web3.provider.make_request
+
+        def make_request(method, params):
+            self.requests[method] = self.requests.get(method, 0) + 1
+            return self._make_request(method, params)
+
+        self._web3.provider.make_request = make_request
+        if Web3Middleware is not None:
+            self._web3.middleware_onion.add(Web3Middleware, name="rpc_counter")
+        else:
+            self._web3.middleware_onion.add(lambda make_request, w3: make_request, name="rpc_counter")
+        return self
+
+    def __exit__(self, *exc_info):
+        self._web3.middleware_onion.remove("rpc_counter")
+        del self._web3.provider.make_request
+
+    @property
+    def total(self) -> int:
+        return sum(self.requests.values())
+
+class LocalSession:
+    """
+    Stands in for the tools' ForkSession on the local chain, which is already connected. `measure` reverts
+    every benchmark itself and drops the state cached for it.
+    """
+
+    @contextmanager
+    def use(self):
+        yield chain.provider
+
+@dataclass
+class Fixture:
+    """
+    Attributes:
+        account: The account the tools impersonate, funded with USDC.
+        tokens (dict): The token contracts keyed by symbol.
+        routers (dict): The router contracts keyed by DEX name.
+    """
+    account: object
+    tokens: dict
+    routers: dict
+
+def register(contract):
+    """
+    Store a fixture contract's type in the token cache, since the local chain has no explorer to fetch it from.
+    """
+    token_cache.CONTRACT_TYPES_DIR.mkdir(parents=True, exist_ok=True)
+    token_cache.contract_type_file(contract.address).write_text(contract.contract_type.model_dump_json())
+    return contract
+
+def deploy_token(deployer, symbol: str, address: str = None):
+    token = deployer.deploy(project.MockERC20)
+    if address is not None:
+        # Place the token's code at a fixed address, its storage is initialized there below
+        chain.provider.set_code(address, chain.provider.get_code(token.address))
+        token = project.MockERC20.at(address)
+    token.initialize(symbol, sender=deployer)
+    return register(token)
+
+def deploy_fixture() -> Fixture:
+    """
+    Deploy the tokens and both DEXes, and seed every token pair with liquidity on each of them.
+
+    Returns:
+        Fixture: The deployed contracts.
+    """
+    deployer = accounts.test_accounts[0]
+    multicall.Call.inject()
+
+    tokens = {"WAVAX": deploy_token(deployer, "WAVAX", NATIVE_TOKEN_ADDRESS)}
+    tokens.update({symbol: deploy_token(deployer, symbol) for symbol in TOKEN_SYMBOLS})
+    account = impersonate_account()
+    chain.provider.set_balance(account.address, 100 * 10**18)
+    tokens["USDC"].mint(account.address, TRADING_BALANCE, sender=deployer)
+
+    mispricing = {(symbol_a, symbol_b): multiplier for symbol_a, symbol_b, multiplier in MISPRICED_POOLS}
+    routers = {}
+    for dex in ("TraderJoe", "SushiSwap"):
+        factory = deployer.deploy(project.MockUniswapV2Factory)
+        routers[dex] = register(deployer.deploy(project.MockUniswapV2Router, factory.address))
+        for symbol_a, symbol_b in combinations(tokens, 2):
+            factory.createPair(tokens[symbol_a].address, tokens[symbol_b].address, sender=deployer)
+            pair = project.MockUniswapV2Pair.at(factory.getPair(tokens[symbol_a].address, tokens[symbol_b].address))
+            multiplier = mispricing.get((symbol_a, symbol_b), 1.0) if dex == "SushiSwap" else 1.0
+            tokens[symbol_a].mint(pair.address, LIQUIDITY, sender=deployer)
+            tokens[symbol_b].mint(pair.address, int(LIQUIDITY * multiplier), sender=deployer)
+            pair.sync(sender=deployer)
+
+    return Fixture(account, tokens, routers)
+
+def measure(name: str, operations: int, function) -> BenchmarkResult:
+    """
+    Run `function` once on a snapshot of the fixture, counting its time and RPC requests.
+
+    Reverting the snapshot also reverts the approvals the run made, so the cached allowances are dropped
+    with it, as the fork session does after every tool call.
+    """
+    snapshot = chain.snapshot()
+    try:
+        with RpcCounter() as counter:
+            start = time.perf_counter()
+            function()
+            seconds = time.perf_counter() - start
+    finally:
+        chain.restore(snapshot)
+        _clear_allowances()
+    return BenchmarkResult(name, operations, seconds, counter.total)
+
+def measure_median(name: str, function) -> BenchmarkResult:
+    """
+    Run a single detection REPEATS times and keep the run with the median latency.
+    """
+    results = sorted((measure(name, 1, function) for _ in range(REPEATS)), key=lambda result: result.seconds)
+    return results[len(results) // 2]
+
+def run_benchmarks(fixture: Fixture) -> list:
+    tokens, routers = fixture.tokens, fixture.routers
+    session = LocalSession()
+    traderjoe, sushiswap = routers["TraderJoe"], routers["SushiSwap"]
+    usdc, usdt = tokens["USDC"].address, tokens["USDT"].address
+    path = [usdc, NATIVE_TOKEN_ADDRESS, usdt]
+    amounts = [(i + 1) * 10**18 for i in range(QUOTES)]
+    router_addresses = {dex: router.address for dex, router in routers.items()}
+    watchlist = [(token_a.address, token_b.address) for token_a, token_b in combinations(tokens.values(), 2)]
+    watchlist += [(token_b, token_a) for token_a, token_b in watchlist]
+
+    def refresh_graph():
+        graph.refresh()
+        graph.find_cycles()
+
+    # Pair discovery only happens once per process, so the graph is built before it is measured
+    graph = ArbitrageGraph(tokens=[token.address for token in tokens.values()], routers=router_addresses)
+
+    return [
+        # Quoting: one router call per quote, as find_arbitrage used to poll, against batched and local quotes
+        measure("router.getAmountsOut (one call per quote)", QUOTES,
+                lambda: [traderjoe.getAmountsOut(amount, path) for amount in amounts]),
+        measure("multicall.quote_amounts_out", QUOTES,
+                lambda: quote_amounts_out([(traderjoe, path, amount) for amount in amounts])),
+        measure("amm.get_amounts_out (reserves + local math)", QUOTES,
+                lambda: get_amounts_out(np.array(amounts, dtype=object), path, fetch_path_reserves(traderjoe, path))),
+        measure("traderjoe_sushiswap.check_prices", QUOTES,
+                lambda: [check_prices([traderjoe, sushiswap], usdc, usdt, amount) for amount in amounts[:QUOTES // 2]]),
+        # Detection, end to end through the tools' entry points
+        measure_median("traderjoe_tools.find_arbitrage_traderjoe",
+                       lambda: find_arbitrage_traderjoe(usdc, usdt, traderjoe.address, session=session)),
+        measure_median("sushiswap_tools.find_arbitrage_sushiswap",
+                       lambda: find_arbitrage_sushiswap(usdc, usdt, sushiswap.address, session=session)),
+        measure_median("traderjoe_sushiswap.find_arbitrage_sushiswap_traderjoe",
+                       lambda: find_arbitrage_sushiswap_traderjoe(usdc, usdt, traderjoe.address, sushiswap.address,
+                                                                  session=session)),
+        measure_median(f"arbitrage_scanner.scan_pairs ({len(watchlist)} pairs)",
+                       lambda: scan_pairs(watchlist, routers=router_addresses)),
+        measure_median(f"arbitrage_graph refresh + find_cycles ({len(tokens)} tokens)", refresh_graph),
+    ]
+
+def check_stalls(results: list):
+    """
+    Fail the run if a detection stalled, e.g. by waiting for reserve changes while it holds the fork, which
+    blocks every other tool call for as long.
+    """
+    stalled = [result for result in results if result.operations == 1 and result.seconds > STALL_SECONDS]
+    if stalled:
+        raise SystemExit("Detection stalled: " + ", ".join(f"{result.name} took {result.seconds:.1f}s" for result in stalled))
+
+def print_results(results: list, baseline: dict = None):
+    print(f"\n{'benchmark':<60} {'ops':>6} {'ops/s':>10} {'latency ms':>11} {'rpc/op':>8}")
+    for result in results:
+        line = (f"{result.name:<60} {result.operations:>6} {result.per_second:>10.1f} "
+                f"{result.latency_ms:>11.2f} {result.rpc_per_operation:>8.2f}")
+        if baseline and result.name in baseline:
+            previous = BenchmarkResult(**baseline[result.name])
+            line += f"   latency {result.latency_ms / previous.latency_ms - 1:+.1%}, rpc/op {result.rpc_per_operation - previous.rpc_per_operation:+.2f}"
+        print(line)
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Keep the local chain's contracts and tokens out of the on-disk cache the tools use for mainnet
+        token_cache.CACHE_DIR = Path(cache_dir)
+        token_cache.TOKEN_METADATA_FILE = token_cache.CACHE_DIR / "token_metadata.json"
+        token_cache.CONTRACT_TYPES_DIR = token_cache.CACHE_DIR / "contract_types"
+
+        with networks.parse_network_choice(LOCAL_NETWORK):
+            print("Deploying the local DEX fixture...")
+            results = run_benchmarks(deploy_fixture())
+
+    baseline = json.loads(BASELINE_FILE.read_text()) if "--compare" in sys.argv and BASELINE_FILE.exists() else None
+    print_results(results, baseline)
+    check_stalls(results)
+    if "--save" in sys.argv:
+        BASELINE_FILE.write_text(json.dumps({result.name: asdict(result) for result in results}, indent=2))
+        print(f"\nSaved the baseline to {BASELINE_FILE}")
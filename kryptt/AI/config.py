@@ -37,5 +37,8 @@ E2B_API_KEY = os.getenv("E2B_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 ALPACA_API_KEY = os.getenv("ALPACA_API_KEY")
 ALPACA_SECRET_KEY= os.getenv("ALPACA_SECRET_KEY")
+
+# MongoDB collection of the normalized articles, written by get_news_articles
+ARTICLES_COLLECTION = "articles"
 # Export the logger
 __all__ = ['log']
\ No newline at end of file
@@ -0,0 +1,96 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.10;
+
+interface IERC20 {
+    function balanceOf(address account) external view returns (uint256);
+    function approve(address spender, uint256 amount) external returns (bool);
+    function transfer(address to, uint256 amount) external returns (bool);
+}
+
+interface IPool {
+    function flashLoanSimple(
+        address receiverAddress,
+        address asset,
+        uint256 amount,
+        bytes calldata params,
+        uint16 referralCode
+    ) external;
+}
+
+interface IUniswapV2Router {
+    function swapExactTokensForTokens(
+        uint256 amountIn,
+        uint256 amountOutMin,
+        address[] calldata path,
+        address to,
+        uint256 deadline
+    ) external returns (uint256[] memory amounts);
+}
+
+/// @notice Borrows from an Aave V3 pool, trades the loan along a route of router swaps and repays it,
+/// all inside one transaction. The whole transaction reverts unless the route covers the loan, its
+/// premium and a minimum profit, so an unprofitable route costs nothing but gas.
+contract FlashLoanArbitrage {
+    struct Swap {
+        address router;
+        address[] path;
+    }
+
+    address public immutable owner;
+    IPool public immutable pool;
+
+    constructor(address pool_) {
+        owner = msg.sender;
+        pool = IPool(pool_);
+    }
+
+    modifier onlyOwner() {
+        require(msg.sender == owner, "caller is not the owner");
+        _;
+    }
+
+    /// @param asset The token to borrow, which the route has to start and end with.
+    /// @param amount The amount to borrow and trade.
+    /// @param route abi.encode(Swap[] swaps, uint256 minProfit, uint256 deadline), built off-chain.
+    function requestFlashLoan(address asset, uint256 amount, bytes calldata route) external onlyOwner {
+        pool.flashLoanSimple(address(this), asset, amount, route, 0);
+    }
+
+    /// @notice Called by the pool once the loan has been sent to this contract.
+    function executeOperation(
+        address asset,
+        uint256 amount,
+        uint256 premium,
+        address initiator,
+        bytes calldata params
+    ) external returns (bool) {
+        require(msg.sender == address(pool), "caller is not the pool");
+        require(initiator == address(this), "loan was not requested by this contract");
+
+        (Swap[] memory swaps, uint256 minProfit, uint256 deadline) = abi.decode(params, (Swap[], uint256, uint256));
+        require(swaps.length > 0, "empty route");
+
+        uint256 amountIn = amount;
+        for (uint256 i = 0; i < swaps.length; i++) {
+            Swap memory swap = swaps[i];
+            IERC20(swap.path[0]).approve(swap.router, amountIn);
+            uint256[] memory amounts = IUniswapV2Router(swap.router).swapExactTokensForTokens(
+                amountIn, 0, swap.path, address(this), deadline
+            );
+            amountIn = amounts[amounts.length - 1];
+        }
+
+        address[] memory lastPath = swaps[swaps.length - 1].path;
+        require(lastPath[lastPath.length - 1] == asset, "route does not end in the borrowed asset");
+
+        uint256 owed = amount + premium;
+        require(amountIn >= owed + minProfit, "arbitrage not profitable");
+        // The pool pulls the loan and its premium back after this call returns
+        IERC20(asset).approve(address(pool), owed);
+        return true;
+    }
+
+    function withdraw(address token) external onlyOwner {
+        IERC20(token).transfer(owner, IERC20(token).balanceOf(address(this)));
+    }
+}
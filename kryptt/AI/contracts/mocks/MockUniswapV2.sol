@@ -0,0 +1,165 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.10;
+
+/// @notice Minimal UniswapV2-style token, factory, pair and router for benchmarking the DEX tools on a
+/// local chain. The pair and router math matches UniswapV2 (0.3% fee, constant product) so quotes are
+/// directly comparable; liquidity tokens, TWAP oracles and fee-on-transfer support are left out.
+
+contract MockERC20 {
+    uint8 public constant decimals = 18;
+    string public symbol;
+    mapping(address => uint256) public balanceOf;
+    mapping(address => mapping(address => uint256)) public allowance;
+
+    event Transfer(address indexed from, address indexed to, uint256 value);
+    event Approval(address indexed owner, address indexed spender, uint256 value);
+
+    /// @dev Storage is set here rather than in a constructor, so the code can also be placed at a fixed address.
+    function initialize(string calldata symbol_) external {
+        symbol = symbol_;
+    }
+
+    function mint(address to, uint256 amount) external {
+        balanceOf[to] += amount;
+        emit Transfer(address(0), to, amount);
+    }
+
+    function approve(address spender, uint256 amount) external returns (bool) {
+        allowance[msg.sender][spender] = amount;
+        emit Approval(msg.sender, spender, amount);
+        return true;
+    }
+
+    function transfer(address to, uint256 amount) external returns (bool) {
+        _transfer(msg.sender, to, amount);
+        return true;
+    }
+
+    function transferFrom(address from, address to, uint256 amount) external returns (bool) {
+        if (allowance[from][msg.sender] != type(uint256).max) {
+            allowance[from][msg.sender] -= amount;
+        }
+        _transfer(from, to, amount);
+        return true;
+    }
+
+    function _transfer(address from, address to, uint256 amount) internal {
+        balanceOf[from] -= amount;
+        balanceOf[to] += amount;
+        emit Transfer(from, to, amount);
+    }
+}
+
+contract MockUniswapV2Pair {
+    address public token0;
+    address public token1;
+    uint112 private reserve0;
+    uint112 private reserve1;
+    uint32 private blockTimestampLast;
+
+    event Sync(uint112 reserve0, uint112 reserve1);
+
+    constructor(address token0_, address token1_) {
+        token0 = token0_;
+        token1 = token1_;
+    }
+
+    function getReserves() external view returns (uint112, uint112, uint32) {
+        return (reserve0, reserve1, blockTimestampLast);
+    }
+
+    /// @notice Adopt the pair's token balances as its reserves, after liquidity was transferred in.
+    function sync() public {
+        reserve0 = uint112(MockERC20(token0).balanceOf(address(this)));
+        reserve1 = uint112(MockERC20(token1).balanceOf(address(this)));
+        blockTimestampLast = uint32(block.timestamp);
+        emit Sync(reserve0, reserve1);
+    }
+
+    function swap(uint256 amount0Out, uint256 amount1Out, address to) external {
+        if (amount0Out > 0) MockERC20(token0).transfer(to, amount0Out);
+        if (amount1Out > 0) MockERC20(token1).transfer(to, amount1Out);
+
+        uint256 balance0 = MockERC20(token0).balanceOf(address(this));
+        uint256 balance1 = MockERC20(token1).balanceOf(address(this));
+        uint256 amount0In = balance0 > reserve0 - amount0Out ? balance0 - (reserve0 - amount0Out) : 0;
+        uint256 amount1In = balance1 > reserve1 - amount1Out ? balance1 - (reserve1 - amount1Out) : 0;
+        uint256 adjusted0 = balance0 * 1000 - amount0In * 3;
+        uint256 adjusted1 = balance1 * 1000 - amount1In * 3;
+        require(adjusted0 * adjusted1 >= uint256(reserve0) * reserve1 * 1000**2, "K");
+        sync();
+    }
+}
+
+contract MockUniswapV2Factory {
+    mapping(address => mapping(address => address)) public getPair;
+    address[] public allPairs;
+
+    function createPair(address tokenA, address tokenB) external returns (address pair) {
+        (address token0, address token1) = tokenA < tokenB ? (tokenA, tokenB) : (tokenB, tokenA);
+        pair = address(new MockUniswapV2Pair(token0, token1));
+        getPair[token0][token1] = pair;
+        getPair[token1][token0] = pair;
+        allPairs.push(pair);
+    }
+
+    function allPairsLength() external view returns (uint256) {
+        return allPairs.length;
+    }
+}
+
+contract MockUniswapV2Router {
+    address public immutable factory;
+
+    constructor(address factory_) {
+        factory = factory_;
+    }
+
+    function getAmountOut(uint256 amountIn, uint256 reserveIn, uint256 reserveOut) public pure returns (uint256) {
+        uint256 amountInWithFee = amountIn * 997;
+        return amountInWithFee * reserveOut / (reserveIn * 1000 + amountInWithFee);
+    }
+
+    function getAmountsOut(uint256 amountIn, address[] memory path) public view returns (uint256[] memory amounts) {
+        require(path.length >= 2, "invalid path");
+        amounts = new uint256[](path.length);
+        amounts[0] = amountIn;
+        for (uint256 i = 0; i < path.length - 1; i++) {
+            (uint256 reserveIn, uint256 reserveOut) = _reserves(path[i], path[i + 1]);
+            amounts[i + 1] = getAmountOut(amounts[i], reserveIn, reserveOut);
+        }
+    }
+
+    function swapExactTokensForTokens(
+        uint256 amountIn,
+        uint256 amountOutMin,
+        address[] calldata path,
+        address to,
+        uint256 deadline
+    ) external returns (uint256[] memory amounts) {
+        require(block.timestamp <= deadline, "expired");
+        amounts = getAmountsOut(amountIn, path);
+        require(amounts[amounts.length - 1] >= amountOutMin, "insufficient output amount");
+
+        MockERC20(path[0]).transferFrom(msg.sender, _pair(path[0], path[1]), amountIn);
+        for (uint256 i = 0; i < path.length - 1; i++) {
+            address pair = _pair(path[i], path[i + 1]);
+            address recipient = i < path.length - 2 ? _pair(path[i + 1], path[i + 2]) : to;
+            (uint256 amount0Out, uint256 amount1Out) = path[i] == MockUniswapV2Pair(pair).token0()
+                ? (uint256(0), amounts[i + 1])
+                : (amounts[i + 1], uint256(0));
+            MockUniswapV2Pair(pair).swap(amount0Out, amount1Out, recipient);
+        }
+    }
+
+    function _pair(address tokenA, address tokenB) internal view returns (address pair) {
+        pair = MockUniswapV2Factory(factory).getPair(tokenA, tokenB);
+        require(pair != address(0), "no pair");
+    }
+
+    function _reserves(address tokenIn, address tokenOut) internal view returns (uint256, uint256) {
+        MockUniswapV2Pair pair = MockUniswapV2Pair(_pair(tokenIn, tokenOut));
+        (uint112 reserve0, uint112 reserve1, ) = pair.getReserves();
+        return tokenIn == pair.token0() ? (uint256(reserve0), uint256(reserve1)) : (uint256(reserve1), uint256(reserve0));
+    }
+}
@@ -0,0 +1,128 @@
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+from ape import chain, networks
+
+FORK_NETWORK = "avalanche:mainnet-fork:foundry"
+FORK_MAX_AGE = 300  # Seconds before the fork is re-pinned to the latest block on its next use
+
+class ForkSession:
+    """
+    A long-lived forked network shared by the DEX tools.
+
+    The fork is started on first use and kept running. Every `use()` starts from the same snapshot and
+    is reverted afterwards, so tool calls see a clean fork without paying for a new one, except for state
+    a call explicitly `keep()`s, such as a reusable helper contract. The fork is re-pinned to the latest
+    upstream block on demand with `repin()`, or automatically once it is older than `max_age` seconds.
+
+    Args:
+        network_choice (str): The ape network choice of the fork.
+        max_age (float): Seconds after which the fork is re-pinned on its next use. None to never re-pin.
+    """
+
+    def __init__(self, network_choice: str = FORK_NETWORK, max_age: float = FORK_MAX_AGE):
+        self.network_choice = network_choice
+        self.max_age = max_age
+        self.provider = None
+        self._context = None
+        self._snapshot = None
+        self._pinned_at = None
+        self._reset_callbacks = []
+        self._fork_callbacks = []
+        self._lock = threading.RLock()  # Tool calls share the fork state, so they run one at a time
+
+    def start(self):
+        """
+        Start the fork if it is not running yet.
+
+        Returns:
+            provider: The provider of the forked network.
+        """
+        with self._lock:
+            if self.provider is None:
+                print(f"Starting {self.network_choice}...")
+                self._context = networks.parse_network_choice(self.network_choice)
+                self.provider = self._context.__enter__()
+                self._take_snapshot()
+                self._run_fork_callbacks()
+            return self.provider
+
+    def _take_snapshot(self):
+        self._snapshot = chain.snapshot()
+        self._pinned_at = self._pinned_at or time.monotonic()
+
+    def on_reset(self, callback):
+        """
+        Register a callback run whenever the fork state is reverted or re-pinned, e.g. to drop cached state.
+        """
+        self._reset_callbacks.append(callback)
+
+    def _run_reset_callbacks(self):
+        for callback in self._reset_callbacks:
+            callback()
+
+    def on_fork(self, callback):
+        """
+        Register a callback run whenever a fresh fork is started or re-pinned, which drops everything kept.
+        """
+        self._fork_callbacks.append(callback)
+
+    def _run_fork_callbacks(self):
+        for callback in self._fork_callbacks:
+            callback()
+
+    def keep(self):
+        """
+        Make the current fork state the one every later tool call starts from, e.g. right after deploying
+        a contract which can be reused. Only call it inside `use()` before the call has changed anything
+        which should still be reverted.
+        """
+        with self._lock:
+            self._take_snapshot()
+
+    def repin(self, block_number: int = None):
+        """
+        Re-fork from a newer upstream block and make it the state every tool call starts from.
+
+        Args:
+            block_number (int, optional): The block to fork from. Defaults to the latest block.
+        """
+        with self._lock:
+            self.start()
+            self.provider.reset_fork(block_number=block_number)
+            self._pinned_at = time.monotonic()
+            self._take_snapshot()
+            self._run_reset_callbacks()
+            self._run_fork_callbacks()
+            print(f"Fork re-pinned to block {chain.blocks.head.number}")
+
+    @contextmanager
+    def use(self):
+        """
+        Run a tool call on the fork, reverting every change it made once it is done.
+
+        Yields:
+            provider: The provider of the forked network.
+        """
+        with self._lock:
+            self.start()
+            if self.max_age is not None and time.monotonic() - self._pinned_at > self.max_age:
+                self.repin()
+            try:
+                yield self.provider
+            finally:
+                chain.restore(self._snapshot)
+                # Reverting consumes the snapshot, so take a new one of the same state for the next call
+                self._take_snapshot()
+                self._run_reset_callbacks()
+
+    def stop(self):
+        with self._lock:
+            if self._context is not None:
+                self._context.__exit__(None, None, None)
+            self.provider = self._context = self._snapshot = self._pinned_at = None
+
+# The fork session shared by every DEX tool
+FORK = ForkSession()
+atexit.register(FORK.stop)
@@ -0,0 +1,59 @@
+import threading
+from ape import chain
+
+FEE_HISTORY_BLOCKS = 10  # Recent blocks sampled for base and priority fees
+PRIORITY_FEE_PERCENTILE = 50  # Percentile of the priority fees paid in each sampled block
+SWAP_GAS = 120_000  # Gas of a single hop UniswapV2 swapExactTokensForTokens, approval excluded
+HOP_GAS = 70_000  # Extra gas of every additional hop in the same swap
+
+def estimate_swap_gas(hops: int = 1, swaps: int = 1) -> int:
+    """
+    Returns:
+        int: A conservative gas estimate of `swaps` router swaps of `hops` hops each.
+    """
+    return swaps * (SWAP_GAS + HOP_GAS * (hops - 1))
+
+class GasOracle:
+    """
+    The gas price a transaction sent now should expect to pay, sampled from recent blocks.
+
+    The next block's base fee and the median priority fee of the last FEE_HISTORY_BLOCKS blocks come from a
+    single eth_feeHistory request, which is cached until a new block is mined.
+    """
+
+    def __init__(self, blocks: int = FEE_HISTORY_BLOCKS, percentile: int = PRIORITY_FEE_PERCENTILE):
+        self.blocks = blocks
+        self.percentile = percentile
+        self._block_number = None
+        self._fees = None
+        self._lock = threading.Lock()
+
+    def fees(self) -> tuple:
+        """
+        Returns:
+            tuple: The (base_fee, priority_fee) of the next block, in wei per gas.
+        """
+        block_number = chain.blocks.head.number
+        with self._lock:
+            if block_number != self._block_number:
+                history = chain.provider.web3.eth.fee_history(self.blocks, block_number, [self.percentile])
+                # The last base fee is the one the next block will charge
+                base_fee = history["baseFeePerGas"][-1]
+                priority_fees = sorted(reward[0] for reward in history["reward"]) or [0]
+                self._fees = (base_fee, priority_fees[len(priority_fees) // 2])
+                self._block_number = block_number
+            return self._fees
+
+    def gas_price(self) -> int:
+        base_fee, priority_fee = self.fees()
+        return base_fee + priority_fee
+
+    def gas_cost(self, gas: int) -> int:
+        """
+        Returns:
+            int: The cost of `gas` units at the current gas price, in wei of the native token.
+        """
+        return gas * self.gas_price()
+
+# The gas oracle shared by every DEX tool
+GAS_ORACLE = GasOracle()
@@ -0,0 +1,65 @@
+from ape_ethereum import multicall
+
+def batch_call(calls: list) -> list:
+    """
+    Executes many contract reads in a single Multicall3 `aggregate3` round-trip.
+
+    Args:
+        calls (list): Tuples of a contract method followed by its arguments, e.g. `(router.getAmountsOut, amount_in, path)`.
+
+    Returns:
+        list: The decoded result of each call in order, or None for a call which reverted.
+
+    Raises:
+        Exception: If the multicall itself fails.
+    """
+    if not calls:
+        return []
+
+    try:
+        call = multicall.Call()
+        for method, *args in calls:
+            call.add(method, *args, allowFailure=True)
+        return list(call())
+    except Exception as e:
+        raise Exception(f"Failed to execute multicall: {str(e)}")
+
+def quote_amounts_out(quotes: list) -> list:
+    """
+    Get the expected output amounts for many (router, path, amount_in) quotes in one round-trip.
+
+    Args:
+        quotes (list): Tuples of a router contract, the swap path (list of token addresses) and the input amount.
+
+    Returns:
+        list: The expected output amount of each quote in order, 0 where the router could not quote it.
+    """
+    results = batch_call([
+        (router_contract.getAmountsOut, amount_in, path)
+        for router_contract, path, amount_in in quotes
+    ])
+    return [amounts_out[-1] if amounts_out else 0 for amounts_out in results]
+
+def fetch_token_metadata(token_contracts: list) -> list:
+    """
+    Read the symbol and decimals of many tokens in one round-trip.
+
+    Args:
+        token_contracts (list): The token contract objects.
+
+    Returns:
+        list: A dictionary with the address, symbol and decimals of each token, in order.
+    """
+    results = batch_call([
+        call
+        for token_contract in token_contracts
+        for call in ((token_contract.symbol,), (token_contract.decimals,))
+    ])
+    return [
+        {
+            "address": token_contract.address,
+            "symbol": results[2 * i],
+            "decimals": results[2 * i + 1],
+        }
+        for i, token_contract in enumerate(token_contracts)
+    ]
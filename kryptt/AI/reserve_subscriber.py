@@ -0,0 +1,98 @@
+import threading
+import time
+from dataclasses import replace
+from ape import chain
+from amm import fetch_reserves
+
+# keccak256("Sync(uint112,uint112)"), emitted by a UniswapV2 pair whenever its reserves change
+SYNC_TOPIC = "0x1c411e9a96e071241c2f21f7726b17ae89e3cab4c78be50e062b03a9fffbbad1"
+POLL_INTERVAL = 1.0  # Seconds between checks for a new block
+MAX_LOG_RANGE = 2000  # Maximum number of blocks per eth_getLogs request
+
+class ReserveSubscriber:
+    """
+    An in-memory table of pair reserves, kept current by following new blocks and the pairs' Sync logs.
+
+    The table is seeded with one multicall. After that the chain is only asked for the head block number
+    until it moves, and then for the Sync logs of the new blocks, so nothing is re-read while the pairs
+    are idle. Works against any provider, including the local fork the DEX tools run on, where every
+    transaction sent to the fork mines a block.
+
+    Args:
+        pair_addresses (list): The pair contracts to follow.
+        poll_interval (float): Seconds between checks for a new block.
+    """
+
+    def __init__(self, pair_addresses: list, poll_interval: float = POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.block_number = chain.blocks.head.number
+        self.reserves = fetch_reserves(pair_addresses)  # pair address -> PairReserves
+        self._addresses = {address.lower(): address for address in self.reserves}
+
+    def poll(self) -> dict:
+        """
+        Apply the Sync logs of every block mined since the last poll.
+
+        Returns:
+            dict: The new PairReserves of each pair whose reserves changed, keyed by pair address.
+        """
+        head = chain.blocks.head.number
+        if head <= self.block_number or not self._addresses:
+            self.block_number = max(head, self.block_number)
+            return {}
+
+        changed = {}
+        for from_block in range(self.block_number + 1, head + 1, MAX_LOG_RANGE):
+            logs = chain.provider.web3.eth.get_logs({
+                "address": list(self.reserves),
+                "topics": [SYNC_TOPIC],
+                "fromBlock": from_block,
+                "toBlock": min(from_block + MAX_LOG_RANGE - 1, head),
+            })
+            # Logs come in chain order, so the last Sync of a pair holds its current reserves
+            for log in logs:
+                address = self._addresses[log["address"].lower()]
+                data = bytes(log["data"])
+                changed[address] = (int.from_bytes(data[:32], "big"), int.from_bytes(data[32:64], "big"))
+        self.block_number = head
+
+        updates = {}
+        for address, (reserve0, reserve1) in changed.items():
+            pair = self.reserves[address]
+            if (pair.reserve0, pair.reserve1) != (reserve0, reserve1):
+                updates[address] = self.reserves[address] = replace(pair, reserve0=reserve0, reserve1=reserve1)
+        return updates
+
+    def wait_for_changes(self, timeout: float = None) -> dict:
+        """
+        Block until the reserves of at least one pair change.
+
+        Args:
+            timeout (float, optional): Seconds to wait before giving up. Defaults to waiting forever.
+
+        Returns:
+            dict: The pairs whose reserves changed, or an empty dictionary if the timeout expired first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            updates = self.poll()
+            if updates or (deadline is not None and time.monotonic() >= deadline):
+                return updates
+            time.sleep(self.poll_interval)
+
+    def subscribe(self, callback, stop_event: threading.Event = None):
+        """
+        Call `callback(updates, block_number)` every time the reserves of the followed pairs change.
+
+        Args:
+            callback: Called with the changed pairs and the block they were read at, e.g. `ArbitrageGraph.refresh`
+                followed by a re-evaluation.
+            stop_event (threading.Event, optional): Stops following the chain once set.
+        """
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            updates = self.poll()
+            if updates:
+                callback(updates, self.block_number)
+            else:
+                stop_event.wait(self.poll_interval)
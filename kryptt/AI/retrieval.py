@@ -12,6 +12,7 @@ import os
 from pydantic import BaseModel, Field
 
 # Langchain
+from langchain_core.documents import Document
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_huggingface import HuggingFaceEmbeddings
@@ -28,6 +29,7 @@ PC = Pinecone(api_key=PINECONE_API_KEY)
 INDEX = PC.Index("crypto-news")
 EMBEDDINGS = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
 VECTORSTORE = vectorstore_pinecone = PineconeVectorStore(index=INDEX, embedding=EMBEDDINGS)
+CHUNK_FETCH_MULTIPLIER = 4  # Chunks fetched per article returned, as several chunks of one article often match
 
 # CLASSES
 class ArticleResponse(BaseModel):
@@ -38,10 +40,34 @@ class ArticleResponse(BaseModel):
     
 
 ### FUNCTIONS ###
-def vectorstore_search(user_query: str):
+def vectorstore_search(user_query: str, k: int = 3, collapse_chunks: bool = True):
+    """
+    Accepts a prompt and a vectorstore. Using the information provided they query the vectorstore to find information on news articles.
+
+    Articles are embedded as several chunks, so when `collapse_chunks` is set more chunks are fetched and
+    the hits are merged back into `k` unique articles, each holding its matching chunks in reading order.
+    """
     print(f"Searching vectorstore for query: {user_query}")
-    "Accepts a prompt and a vectorstore. Using the information provided they query the vectorstore to find information on news articles."
-    return VECTORSTORE.similarity_search(query=user_query, k=3)
+    if not collapse_chunks:
+        return VECTORSTORE.similarity_search(query=user_query, k=k)
+
+    hits = VECTORSTORE.similarity_search(query=user_query, k=k * CHUNK_FETCH_MULTIPLIER)
+
+    # Hits come back best first, so the first chunk seen decides an article's rank
+    articles = {}
+    for doc in hits:
+        parent_id = doc.metadata.get("parent_id", doc.metadata.get("data_id"))
+        if parent_id not in articles and len(articles) == k:
+            continue
+        articles.setdefault(parent_id, []).append(doc)
+
+    return [
+        Document(
+            page_content="\n...\n".join(chunk.page_content for chunk in sorted(chunks, key=lambda chunk: chunk.metadata.get("chunk_index", 0))),
+            metadata=chunks[0].metadata
+        )
+        for chunks in articles.values()
+    ]
 
 
 def generate_response(user_query: str):
@@ -54,6 +80,7 @@ def generate_response(user_query: str):
     context_dict = {
     "articles": [
         {
+            "data_id": doc.metadata.get("data_id"),
             "title": doc.metadata.get("title", "No title"),
             "url": doc.metadata.get("link", "No URL"),
             "content": doc.page_content,
@@ -0,0 +1,158 @@
+import threading
+from dataclasses import dataclass
+from ape import chain
+from fork_session import FORK
+from gas_oracle import GAS_ORACLE
+from token_cache import get_contract
+
+WAVAX_ADDRESS = "0xB31f66AA3C1e785363F0875A1B74E27b85FD66c7"  # WAVAX on Avalanche
+MAX_APPROVAL = 2**256 - 1
+
+_allowance_lock = threading.Lock()
+_allowances = {}  # (owner, token, spender) -> allowance, as of the current fork state
+
+def _clear_allowances():
+    with _allowance_lock:
+        _allowances.clear()
+
+# Reverting the fork reverts every approval made on it
+FORK.on_reset(_clear_allowances)
+
+def get_allowance(owner: str, token_address: str, spender: str) -> int:
+    """
+    The allowance of `spender` over the tokens of `owner`, read on-chain only the first time.
+    """
+    key = (owner.lower(), token_address.lower(), spender.lower())
+    with _allowance_lock:
+        if key in _allowances:
+            return _allowances[key]
+    allowance = get_contract(token_address).allowance(owner, spender)
+    with _allowance_lock:
+        _allowances[key] = allowance
+    return allowance
+
+def ensure_allowance(account, token_address: str, spender: str, amount: int):
+    """
+    Approve `spender` for the maximum amount, unless its current allowance already covers `amount`.
+
+    Args:
+        account: The account object.
+        token_address (str): The address of the token contract.
+        spender (str): The address allowed to spend the tokens, e.g. a router.
+        amount (int): The amount about to be spent.
+
+    Returns:
+        receipt | None: The approval transaction, or None if no approval was needed.
+    """
+    if get_allowance(account.address, token_address, spender) >= amount:
+        return None
+    tx = get_contract(token_address).approve(spender, MAX_APPROVAL, sender=account)
+    with _allowance_lock:
+        _allowances[(account.address.lower(), token_address.lower(), spender.lower())] = MAX_APPROVAL
+    return tx
+
+@dataclass
+class SimulationResult:
+    """
+    The outcome of dry-running an arbitrage bundle.
+
+    Attributes:
+        amount_in (int): The amount of the starting token put in.
+        amount_out (int): The amount of the starting token the sell leg returns.
+        gas_used (int): The gas of every transaction in the bundle, approvals included.
+        gas_cost (int): The cost of that gas in the native token, in wei.
+        gas_cost_in_token (int | None): The cost of that gas in the starting token, or None if it cannot be priced.
+        error (str | None): Why the bundle reverted, if it did.
+    """
+    amount_in: int
+    amount_out: int = 0
+    gas_used: int = 0
+    gas_cost: int = 0
+    gas_cost_in_token: int | None = None
+    error: str | None = None
+
+    @property
+    def profit(self) -> int:
+        return self.amount_out - self.amount_in
+
+    @property
+    def net_profit(self) -> int | None:
+        if self.gas_cost_in_token is None:
+            return None
+        return self.profit - self.gas_cost_in_token
+
+    @property
+    def profitable(self) -> bool:
+        return self.error is None and self.net_profit is not None and self.net_profit > 0
+
+def gas_cost_in_token(router_contract, gas_cost: int, token_address: str) -> int | None:
+    """
+    Convert a gas cost in the native token into `token_address` at the router's current price.
+    """
+    if token_address.lower() == WAVAX_ADDRESS.lower():
+        return gas_cost
+    try:
+        return router_contract.getAmountsOut(gas_cost, [WAVAX_ADDRESS, token_address])[-1]
+    except Exception:
+        return None
+
+def simulate_arbitrage(account, buy_router, sell_router, token_in: dict, token_out: dict, amount_in: int, deadline: int,
+                       buy_path: list = None, sell_path: list = None, gas_price: int = None) -> SimulationResult:
+    """
+    Dry-run a buy and sell bundle against the current fork state before anything is broadcast.
+
+    The sell leg depends on the state the buy leaves behind, which a single eth_call cannot express, so the
+    bundle is played on top of a fork snapshot: approvals only if the cached allowance is too low, the buy
+    as a transaction, and the sell as an eth_call on the resulting state. Everything is reverted afterwards.
+
+    Args:
+        account: The account object.
+        buy_router: The router contract `token_out` is bought on.
+        sell_router: The router contract `token_out` is sold on.
+        token_in (dict): The address, symbol and decimals of the token the bundle starts and ends with.
+        token_out (dict): The address, symbol and decimals of the token bought and sold.
+        amount_in (int): The amount of `token_in` to trade.
+        deadline (int): The deadline for the swaps.
+        buy_path (list, optional): The token addresses of the buy. Defaults to the direct pair.
+        sell_path (list, optional): The token addresses of the sell. Defaults to the direct pair.
+        gas_price (int, optional): The gas price to cost the bundle at. Defaults to the gas oracle's price.
+
+    Returns:
+        SimulationResult: The output, gas and net profit of the bundle, or the reason it reverted.
+    """
+    buy_path = buy_path or [token_in["address"], token_out["address"]]
+    sell_path = sell_path or [token_out["address"], token_in["address"]]
+    gas_price = gas_price if gas_price is not None else GAS_ORACLE.gas_price()
+    result = SimulationResult(amount_in=amount_in)
+
+    with _allowance_lock:
+        allowances_before = dict(_allowances)
+    snapshot = chain.snapshot()
+    try:
+        approval = ensure_allowance(account, token_in["address"], buy_router.address, amount_in)
+        result.gas_used += approval.gas_used if approval is not None else 0
+
+        token_out_contract = get_contract(token_out["address"])
+        balance_before = token_out_contract.balanceOf(account.address)
+        buy = buy_router.swapExactTokensForTokens(amount_in, 0, buy_path, account.address, deadline, sender=account)
+        result.gas_used += buy.gas_used
+        bought = token_out_contract.balanceOf(account.address) - balance_before
+
+        approval = ensure_allowance(account, token_out["address"], sell_router.address, bought)
+        result.gas_used += approval.gas_used if approval is not None else 0
+
+        sell_args = (bought, 0, sell_path, account.address, deadline)
+        result.amount_out = sell_router.swapExactTokensForTokens.call(*sell_args, sender=account)[-1]
+        result.gas_used += sell_router.swapExactTokensForTokens.estimate_gas_cost(*sell_args, sender=account)
+    except Exception as e:
+        result.error = str(e)
+    finally:
+        chain.restore(snapshot)
+        # The approvals made above were reverted with the rest of the bundle
+        with _allowance_lock:
+            _allowances.clear()
+            _allowances.update(allowances_before)
+
+    result.gas_cost = result.gas_used * gas_price
+    result.gas_cost_in_token = gas_cost_in_token(sell_router, result.gas_cost, token_in["address"])
+    return result
@@ -1,5 +1,3 @@
-from ape import networks
-
 # Import functions from traderjoe_tools.py
 from traderjoe_tools import (
     impersonate_account,
@@ -7,25 +5,30 @@ from traderjoe_tools import (
     load_token_contracts,
     find_arbitrage
 )
+from fork_session import FORK
 
 # Sushiswap-specific constants
 SUSHISWAP_ROUTER_ADDRESS = "0x1b02dA8Cb0d097eB8D57A175b88c7D8b47997506"  # Sushiswap Router v2 contract
 WAVAX_ADDRESS = "0xB31f66AA3C1e785363F0875A1B74E27b85FD66c7"  # WAVAX on Avalanche
 
-def find_arbitrage_sushiswap(token1_address: str, token2_address: str):
+def find_arbitrage_sushiswap(token1_address: str, token2_address: str, router_address: str = SUSHISWAP_ROUTER_ADDRESS,
+                             session=FORK):
     """
     Find arbitrage opportunities within SushiSwap for two given tokens on the Avalanche network.
 
     Args:
         token1_address (str): The contract address of the first token.
         token2_address (str): The contract address of the second token.
+        router_address (str, optional): The router to trade on. Defaults to the SushiSwap router.
+        session (ForkSession, optional): The session to run on, anything whose `use()` yields a connected
+            provider. Defaults to the shared Avalanche fork.
 
     Returns:
         str: A message indicating the results of the arbitrage search.
     """
     print(find_arbitrage_sushiswap.__doc__)  # Print the docstring of the function
 
-    with networks.parse_network_choice("avalanche:mainnet-fork:foundry") as provider:
+    with session.use() as provider:
         print("Setting up Avalanche network...")
 
         # Impersonate an account
@@ -34,7 +37,7 @@ def find_arbitrage_sushiswap(token1_address: str, token2_address: str):
 
         # Load Sushiswap router contract
         print("Loading Sushiswap router contract...")
-        router_contract = load_router_contract(router_address=SUSHISWAP_ROUTER_ADDRESS)
+        router_contract = load_router_contract(router_address=router_address)
 
         # Load token contracts
         print("Loading token contracts...")
@@ -47,4 +50,4 @@ def find_arbitrage_sushiswap(token1_address: str, token2_address: str):
         if arbitrage_found:
             return ("Results from the arbitrage search: ", arbitrage_found)
         else:
-            return f"No arbitrage opportunity found for either: {token0.symbol()} or {token1.symbol()}"
\ No newline at end of file
+            return f"No arbitrage opportunity found for either: {token0['symbol']} or {token1['symbol']}"
\ No newline at end of file
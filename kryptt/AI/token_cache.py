@@ -0,0 +1,119 @@
+import json
+import threading
+from pathlib import Path
+from ape import Contract, chain
+from ethpm_types import ContractType
+from multicall import fetch_token_metadata
+
+# On-disk cache shared by every DEX tool, keyed by (chain_id, address)
+CACHE_DIR = Path(__file__).parent / ".cache"
+TOKEN_METADATA_FILE = CACHE_DIR / "token_metadata.json"
+CONTRACT_TYPES_DIR = CACHE_DIR / "contract_types"
+
+AVALANCHE_CHAIN_ID = 43114
+
+# Common Avalanche tokens, so their metadata never has to be read on-chain
+COMMON_TOKENS = {
+    AVALANCHE_CHAIN_ID: [
+        {"address": "0xB31f66AA3C1e785363F0875A1B74E27b85FD66c7", "symbol": "WAVAX", "decimals": 18},
+        {"address": "0xA7D7079b0FEaD91F3e65f86E8915Cb59c1a4C664", "symbol": "USDC.e", "decimals": 6},
+        {"address": "0xc7198437980c041c805A1EDcbA50c1Ce5db95118", "symbol": "USDT.e", "decimals": 6},
+        {"address": "0xB97EF9Ef8734C71904D8002F8b6Bc66Dd9c48a6E", "symbol": "USDC", "decimals": 6},
+        {"address": "0x9702230A8Ea53601f5cD2dc00fDBc13d4dF4A8c7", "symbol": "USDt", "decimals": 6},
+        {"address": "0xd586E7F844cEa2F87f50152665BCbc2C279D8d70", "symbol": "DAI.e", "decimals": 18},
+        {"address": "0x49D5c2BdFfac6CE2BFdB6640F4F80f226bc10bAB", "symbol": "WETH.e", "decimals": 18},
+        {"address": "0x50b7545627a5162F82A992c33b87aDc75187B218", "symbol": "WBTC.e", "decimals": 8},
+        {"address": "0x6e84a6216eA6dACC71eE8E6b0a5B7322EEbC0fDd", "symbol": "JOE", "decimals": 18},
+    ]
+}
+
+_lock = threading.Lock()
+_contracts = {}  # Contract instances loaded by this process
+_token_metadata = None  # Lazily loaded from TOKEN_METADATA_FILE
+
+def cache_key(address: str) -> str:
+    return f"{chain.chain_id}:{address.lower()}"
+
+def contract_type_file(address: str) -> Path:
+    """The on-disk cache file of a contract's full contract type, as fetched from the explorer."""
+    return CONTRACT_TYPES_DIR / f"{cache_key(address).replace(':', '_')}.json"
+
+def _load_token_metadata() -> dict:
+    global _token_metadata
+    if _token_metadata is None:
+        _token_metadata = {
+            f"{chain_id}:{token['address'].lower()}": token
+            for chain_id, tokens in COMMON_TOKENS.items() for token in tokens
+        }
+        if TOKEN_METADATA_FILE.exists():
+            _token_metadata.update(json.loads(TOKEN_METADATA_FILE.read_text()))
+    return _token_metadata
+
+def _save_token_metadata():
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    temporary_file = TOKEN_METADATA_FILE.with_suffix(".tmp")
+    temporary_file.write_text(json.dumps(_token_metadata, indent=2))
+    temporary_file.replace(TOKEN_METADATA_FILE)
+
+def get_contract(address: str, abi: list = None):
+    """
+    Load a contract, reusing its ABI from the on-disk cache so the explorer is only queried the first time.
+
+    Args:
+        address (str): The address of the contract.
+        abi (list, optional): A known ABI for the contract, e.g. a standard pair interface. Skips the explorer entirely.
+
+    Returns:
+        ContractInstance: The contract object, shared by every caller in this process asking for the same ABI.
+    """
+    # An instance built from a caller's ABI only has that ABI's methods, so it is cached apart from the full one
+    key = cache_key(address) if abi is None else (cache_key(address), json.dumps(abi, sort_keys=True, default=str))
+    with _lock:
+        if key in _contracts:
+            return _contracts[key]
+
+        cached_type_file = contract_type_file(address)
+        if abi is not None:
+            contract = Contract(address, contract_type=ContractType.model_validate({"abi": abi}))
+        elif cached_type_file.exists():
+            contract_type = ContractType.model_validate_json(cached_type_file.read_text())
+            contract = Contract(address, contract_type=contract_type)
+        else:
+            contract = Contract(address)
+            CONTRACT_TYPES_DIR.mkdir(parents=True, exist_ok=True)
+            cached_type_file.write_text(contract.contract_type.model_dump_json())
+
+        _contracts[key] = contract
+        return contract
+
+def get_token_metadata(addresses: list) -> list:
+    """
+    Get the address, symbol and decimals of tokens, reading only uncached tokens on-chain in a single multicall.
+
+    Symbols and decimals are immutable, so once read they are cached on disk indefinitely. Tokens whose
+    read failed are returned with None for the missing fields and read again on the next call.
+
+    Args:
+        addresses (list): The token contract addresses.
+
+    Returns:
+        list: A dictionary with the address, symbol and decimals of each token, in order.
+    """
+    with _lock:
+        token_metadata = _load_token_metadata()
+        missing = list(dict.fromkeys(address for address in addresses if cache_key(address) not in token_metadata))
+
+    fetched = {}
+    if missing:
+        fetched = {
+            cache_key(token["address"]): token
+            for token in fetch_token_metadata([get_contract(address) for address in missing])
+        }
+        with _lock:
+            token_metadata.update({
+                key: token for key, token in fetched.items()
+                if token["symbol"] is not None and token["decimals"] is not None
+            })
+            _save_token_metadata()
+
+    return [dict(token_metadata.get(cache_key(address)) or fetched[cache_key(address)]) for address in addresses]
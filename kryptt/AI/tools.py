@@ -2,12 +2,13 @@
 from config import GROQ_API_KEY, TAVILY_API_KEY
 from traderjoe_tools import find_arbitrage_traderjoe
 from sushiswap_tools import find_arbitrage_sushiswap
-from validation import CoinGeckoFetchTokenInput, CoinGeckoFetchOHLCInput, CoinGeckoFetchTokenDataInput, MoneyInput, AIInput, CoinGeckoFetchTokensPriceInput, oneinchSearchTokensInput, oneinchGetManyTokensInput, GetOrderByIdInput, CancelOrderByIdInput, PostOrderInput, CloseAllPositionsInput, ClosePositionInput, FindArbitrageSushiswapInput, PredictProfitInput, BacktestTradingIndicatorsInput, GetAssetsInput, IsAssetTradableInput
+from validation import CoinGeckoFetchTokenInput, CoinGeckoFetchOHLCInput, CoinGeckoFetchTokenDataInput, MoneyInput, AIInput, CoinGeckoFetchTokensPriceInput, oneinchSearchTokensInput, oneinchGetManyTokensInput, GetOrderByIdInput, CancelOrderByIdInput, PostOrderInput, CloseAllPositionsInput, ClosePositionInput, FindArbitrageSushiswapInput, ScanArbitrageInput, PredictProfitInput, BacktestTradingIndicatorsInput, GetAssetsInput, IsAssetTradableInput
 from coin_gecko_tools import fetch_token, fetch_ohlc_by_id, fetch_coin_data, fetch_tokens_price
 from forex_tools import convert_coin_price
 from one_inch_tools import one_inch_search_tokens, oneinch_get_many_tokens
 from alpaca_tools import get_accounts_details_alpaca, get_all_order_alpaca, get_order_by_id_alpaca, cancel_all_order_alpaca, cancel_order_by_id_alpaca, get_open_orders_alpaca, post_order_alpaca, get_positions_alpaca, close_all_positions, close_a_position, get_all_assets_alpaca, is_asset_tradable_alpaca
 from traderjoe_sushiswap import find_arbitrage_sushiswap_traderjoe
+from arbitrage_scanner import scan_arbitrage
 from backtesting import predict_profit_from_the_past, backtest_with_trading_indicators
 from utilities import tavily_invoke_func, e2b_code_interpreter_func
 from validation import E2BCodeInterpreterInput
@@ -185,6 +186,13 @@ find_arbitrage_traderjoe_tool = StructuredTool.from_function(
     args_schema=FindArbitrageSushiswapInput
 )
 
+scan_arbitrage_tool = StructuredTool.from_function(
+    func=scan_arbitrage,
+    name="scan_arbitrage_tool",
+    description="Scans a whole watchlist of token pairs for arbitrage opportunities between TraderJoe and SushiSwap on ONLY the Avalanche network in a single call, and returns them ranked by return. Prefer this over the single pair arbitrage tools whenever more than one pair has to be checked",
+    args_schema=ScanArbitrageInput
+)
+
 predict_profit_tool = StructuredTool.from_function(
     func=predict_profit_from_the_past,
     name="predict_profit_tool",
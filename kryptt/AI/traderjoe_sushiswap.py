@@ -1,57 +1,73 @@
-from ape import Contract, networks
 from datetime import datetime, timedelta
 from traderjoe_tools import impersonate_account, load_router_contract, load_token_contracts, execute_swap
-import time
+from multicall import quote_amounts_out
+from token_cache import get_contract
+from amm import get_pair_addresses, optimal_amount_in, quote, route_reserves
+from reserve_subscriber import ReserveSubscriber
+from simulation import WAVAX_ADDRESS, simulate_arbitrage
+from gas_oracle import GAS_ORACLE, estimate_swap_gas
+from fork_session import FORK
 
 # Constants
 TRADERJOE_ROUTER = "0x60aE616a2155Ee3d9A68541Ba4544862310933d4"
 SUSHISWAP_ROUTER = "0x1b02dA8Cb0d097eB8D57A175b88c7D8b47997506"  # SushiSwap router on Avalanche
 
-def check_prices(router_contract, token_in, token_out, amount_in):
+def check_prices(routers, token_in, token_out, amount_in):
     """
-    Get the expected output amount for a given input amount using the specified router contract.
+    Get the expected output amount for a given input amount on several routers in a single multicall.
 
     Args:
-        router_contract (Contract): The router contract to use for price checking.
+        routers (list): The router contracts to use for price checking.
         token_in (str): The contract address of the input token.
         token_out (str): The contract address of the output token.
         amount_in (int): The amount of the input token.
 
     Returns:
-        int: The expected output amount of the output token.
-        0: If an error occurs during the price check.
+        list: The expected output amount of the output token on each router, in order.
+        0: For every router if an error occurs during the price check, or for a router without liquidity.
     """
     try:
-        amounts_out = router_contract.getAmountsOut(amount_in, [token_in, token_out])
-        return amounts_out[-1]
+        return quote_amounts_out([(router_contract, [token_in, token_out], amount_in) for router_contract in routers])
     except Exception as e:
         print(f"Error checking prices: {str(e)}")
-        return 0
+        return [0] * len(routers)
 
-def arbitrage_opportunity(traderjoe_price, sushiswap_price, threshold=0.005):
+def arbitrage_opportunity(traderjoe_price, sushiswap_price, threshold=0.005, expected_profit=None, gas_cost=None):
     """
     Determine if there is an arbitrage opportunity between TraderJoe and SushiSwap prices.
 
+    When the expected profit and the gas cost of the trade are known, the opportunity has to be profitable
+    after gas instead of clearing the fixed threshold.
+
     Args:
         traderjoe_price (float): The price of the token on TraderJoe.
         sushiswap_price (float): The price of the token on SushiSwap.
         threshold (float, optional): The minimum price difference ratio to consider an arbitrage opportunity. Defaults to 0.005.
+        expected_profit (float, optional): The expected profit of the trade before gas.
+        gas_cost (float, optional): The gas cost of the trade, in the same unit as `expected_profit`.
 
     Returns:
         bool: True if there is an arbitrage opportunity, False otherwise.
     """
     if traderjoe_price == 0 or sushiswap_price == 0:
         return False
+    if expected_profit is not None and gas_cost is not None:
+        return expected_profit > gas_cost
     price_diff = abs(traderjoe_price - sushiswap_price) / min(traderjoe_price, sushiswap_price)
     return price_diff > threshold
 
-def find_arbitrage_sushiswap_traderjoe(token1_address, token2_address):
+def find_arbitrage_sushiswap_traderjoe(token1_address, token2_address, traderjoe_router_address=TRADERJOE_ROUTER,
+                                       sushiswap_router_address=SUSHISWAP_ROUTER, session=FORK):
     """
     Find arbitrage opportunities between TraderJoe and SushiSwap for two given token addresses on the Avalanche network.
 
     Args:
         token1_address (str): The contract address of the first token.
         token2_address (str): The contract address of the second token.
+        traderjoe_router_address (str, optional): The TraderJoe router. Defaults to TraderJoe V1.
+        sushiswap_router_address (str, optional): The SushiSwap router.
+        session (ForkSession, optional): The session to run on, anything whose `use()` yields a connected
+            provider. Defaults to the shared Avalanche fork.
 
     Returns:
         str: A message indicating the final total profit from arbitrage opportunities.
@@ -61,65 +77,130 @@ def find_arbitrage_sushiswap_traderjoe(token1_address, token2_address):
 
     try:
         print("Setting up Avalanche network...")
-        with networks.parse_network_choice("avalanche:mainnet-fork:foundry") as provider:
+        with session.use() as provider:
             print("Impersonating account...")
             account = impersonate_account()
         
             print("Loading router contracts...")
-            traderjoe_router = load_router_contract(router_address=TRADERJOE_ROUTER)
-            sushiswap_router = load_router_contract(router_address=SUSHISWAP_ROUTER)
+            traderjoe_router = load_router_contract(router_address=traderjoe_router_address)
+            sushiswap_router = load_router_contract(router_address=sushiswap_router_address)
         
             print("Loading token contracts...")
             token1, token2 = load_token_contracts(token1_address, token2_address)
         
-            amount_in = 10 * 10**token1['decimals']  # x amount of token1
-            print(f"Setting input amount to {amount_in / 10**token1['decimals']} {token1['symbol']}")
+            # Follow the Sync logs of both pairs, so prices are only re-checked once a pool actually moved. The
+            # WAVAX pair of token1 is followed as well, to price the gas in token1 without another request
+            pair_addresses = [
+                get_pair_addresses(router, [(token1['address'], token2['address'])])[0]
+                for router in (traderjoe_router, sushiswap_router)
+            ]
+            native_is_token1 = token1['address'].lower() == WAVAX_ADDRESS.lower()
+            native_pair_address = None if native_is_token1 else get_pair_addresses(
+                traderjoe_router, [(WAVAX_ADDRESS, token1['address'])]
+            )[0]
+            subscriber = ReserveSubscriber([address for address in (*pair_addresses, native_pair_address) if address])
         
             for iteration in range(MAX_ITERATIONS):
+                # The fork lock is held for the whole loop, so the Sync logs are read once instead of waited on
+                if iteration > 0 and not subscriber.poll():
+                    print("Reserves unchanged, skipping the price check")
+                    continue
+
                 print(f"\nIteration {iteration + 1}/{MAX_ITERATIONS}")
+                if any(address not in subscriber.reserves for address in pair_addresses):
+                    print("Unable to fetch prices. There might not be a liquidity pool for these tokens on one or both exchanges.")
+                    continue
+
+                # Solve the profit-maximizing input of both directions at once from the current reserves
+                print("Sizing the trade from the pool reserves...")
+                traderjoe_pair, sushiswap_pair = (subscriber.reserves[address] for address in pair_addresses)
+                directions = [
+                    (traderjoe_router, sushiswap_router, [traderjoe_pair, sushiswap_pair]),
+                    (sushiswap_router, traderjoe_router, [sushiswap_pair, traderjoe_pair]),
+                ]
+                cycle = [token1['address'], token2['address'], token1['address']]
+                routes = [route_reserves(cycle, pairs) for _, _, pairs in directions]
+                amounts_in, profits = optimal_amount_in(
+                    [reserves_in for reserves_in, _ in routes],
+                    [reserves_out for _, reserves_out in routes],
+                    [[pair.fee_bps for pair in pairs] for _, _, pairs in directions],
+                )
+                best = int(profits.argmax())
+                amount_in = int(amounts_in[best])
+                if amount_in == 0:
+                    print("No arbitrage opportunity found between these tokens on TraderJoe and SushiSwap.")
+                    continue
+                buy_router, sell_router, _ = directions[best]
+                print(f"Setting input amount to {amount_in / 10**token1['decimals']} {token1['symbol']}")
+
                 print("Checking prices...")
-                traderjoe_price = check_prices(traderjoe_router, token1['address'], token2['address'], amount_in)
-                sushiswap_price = check_prices(sushiswap_router, token1['address'], token2['address'], amount_in)
+                traderjoe_price, sushiswap_price = check_prices(
+                    [traderjoe_router, sushiswap_router], token1['address'], token2['address'], amount_in
+                )
                 
                 if traderjoe_price == 0 or sushiswap_price == 0:
                     print("Unable to fetch prices. There might not be a liquidity pool for these tokens on one or both exchanges.")
                     continue
                 
-                traderjoe_rate = traderjoe_price / 10**token2['decimals']
-                sushiswap_rate = sushiswap_price / 10**token2['decimals']
+                amount_in_units = amount_in / 10**token1['decimals']
+                traderjoe_rate = traderjoe_price / 10**token2['decimals'] / amount_in_units
+                sushiswap_rate = sushiswap_price / 10**token2['decimals'] / amount_in_units
                 
                 print(f"TraderJoe rate: 1 {token1['symbol']} = {traderjoe_rate:.6f} {token2['symbol']}")
                 print(f"SushiSwap rate: 1 {token1['symbol']} = {sushiswap_rate:.6f} {token2['symbol']}")
                 
-                if arbitrage_opportunity(traderjoe_rate, sushiswap_rate):
+                # Price the gas of both swaps in token1, so only trades profitable after gas go on to the simulation
+                gas_cost = GAS_ORACLE.gas_cost(estimate_swap_gas(swaps=2))
+                if not native_is_token1:
+                    native_pair = subscriber.reserves.get(native_pair_address)
+                    gas_cost = quote(gas_cost, native_pair, WAVAX_ADDRESS) if native_pair else None
+                if gas_cost is not None:
+                    print(f"Expected profit: {profits[best] / 10**token1['decimals']:.6f} {token1['symbol']}, gas cost: {gas_cost / 10**token1['decimals']:.6f} {token1['symbol']}")
+
+                if arbitrage_opportunity(traderjoe_rate, sushiswap_rate, expected_profit=profits[best], gas_cost=gas_cost):
                     print("Arbitrage opportunity found!")
-                    if traderjoe_rate < sushiswap_rate:
-                        print(f"Buying on TraderJoe and selling on SushiSwap")
-                        buy_router = traderjoe_router
-                        sell_router = sushiswap_router
-                    else:
-                        print(f"Buying on SushiSwap and selling on TraderJoe")
-                        buy_router = sushiswap_router
-                        sell_router = traderjoe_router
+                    buy_name, sell_name = ("TraderJoe", "SushiSwap") if buy_router is traderjoe_router else ("SushiSwap", "TraderJoe")
+                    print(f"Buying on {buy_name} and selling on {sell_name}")
             
+                    deadline = int((datetime.now() + timedelta(minutes=5)).timestamp())
+
+                    # Dry-run the whole bundle first, so a sell which would revert never leaves a stranded buy behind
+                    print("Simulating the buy and sell bundle...")
+                    simulation = simulate_arbitrage(account, buy_router, sell_router, token1, token2, amount_in, deadline)
+                    if not simulation.profitable:
+                        if simulation.error:
+                            print(f"Skipping the arbitrage, the simulated bundle reverted: {simulation.error}")
+                        elif simulation.net_profit is None:
+                            print("Skipping the arbitrage, the gas cost could not be priced in the input token")
+                        else:
+                            print(f"Skipping the arbitrage, simulated profit after gas: {simulation.net_profit / 10**token1['decimals']} {token1['symbol']}")
+                        continue
+                    print(f"Simulated profit after gas: {simulation.net_profit / 10**token1['decimals']} {token1['symbol']}")
+
                     # Execute buy
                     print("Executing buy transaction...")
-                    deadline = int((datetime.now() + timedelta(minutes=5)).timestamp())
-                    min_amount_out = int(min(traderjoe_price, sushiswap_price) * 0.99)  # 1% slippage
-                    buy_success = execute_swap(account, buy_router, token1, token2, amount_in, min_amount_out, deadline)
+                    buy_price = traderjoe_price if buy_router is traderjoe_router else sushiswap_price
+                    min_amount_out = int(buy_price * 0.99)  # 1% slippage
+                    buy_success = execute_swap(
+                        account, buy_router, token1, token2, amount_in, min_amount_out, deadline,
+                        path=[token1['address'], token2['address']],
+                    )
             
                     if buy_success:
                         print("Buy transaction successful")
                         # Execute sell
                         print("Executing sell transaction...")
-                        sell_amount = Contract(address=token2["address"]).balanceOf(account.address)
+                        sell_amount = get_contract(token2["address"]).balanceOf(account.address)
                         min_amount_out = int(amount_in * 0.99)  # Ensure we get back at least 99% of our original token1
-                        sell_success = execute_swap(account, sell_router, token2, token1, sell_amount, min_amount_out, deadline)
+                        sell_success = execute_swap(
+                            account, sell_router, token2, token1, sell_amount, min_amount_out, deadline,
+                            path=[token2['address'], token1['address']],
+                        )
                 
                         if sell_success:
                             print("Sell transaction successful")
                             print("Arbitrage completed successfully!")
-                            profit = Contract(address=token1["address"]).balanceOf(account.address) - amount_in
+                            profit = get_contract(token1["address"]).balanceOf(account.address) - amount_in
                             total_profit += profit
                             print(f"Profit from this arbitrage: {profit / 10**token1['decimals']} {token1['symbol']}")
                             print(f"Total profit so far: {total_profit / 10**token1['decimals']} {token1['symbol']}")
@@ -130,10 +211,6 @@ def find_arbitrage_sushiswap_traderjoe(token1_address, token2_address):
                 
                 else:
                     print("No arbitrage opportunity found between these tokens on TraderJoe and SushiSwap.")
-                
-                if iteration < MAX_ITERATIONS - 1:
-                    print("Waiting for 3 seconds before next iteration...")
-                    time.sleep(3)
         
         return f"Final total profit: {total_profit / 10**token1['decimals']} {token1['symbol']}"
         
@@ -1,8 +1,12 @@
-from ape import accounts, Contract, networks
+from ape import accounts
 from datetime import datetime
-from tqdm import tqdm
+from amm import fetch_path_reserves, get_amounts_out, optimal_amount_in, quote, route_reserves
+from token_cache import get_contract, get_token_metadata
+from fork_session import FORK
+from simulation import ensure_allowance
+from gas_oracle import GAS_ORACLE, estimate_swap_gas
 
-MAX_ITERATIONS = 1000
+MAX_RATE = 2.00  # Rates above this come from broken or manipulated pools
 ROUTER_ADDRESS = "0x60aE616a2155Ee3d9A68541Ba4544862310933d4" # Traderjoe V1 Router contract
 NATIVE_TOKEN_ADDRESS = "0xB31f66AA3C1e785363F0875A1B74E27b85FD66c7"  # WAVAX on Avalanche
 
@@ -11,16 +15,16 @@ def setup_avalanche():
     Connect to the Avalanche network.
 
     Returns:
-        provider: The network provider for the Avalanche mainnet.
+        provider: The network provider for the Avalanche mainnet fork.
     
     Raises:
         Exception: If the connection to the Avalanche network fails.
     """
     try:
-        # Connect to the Avalanche network
-        with networks.parse_network_choice("avalanche:mainnet-fork:foundry") as provider:
-            print("Connected to Avalanche mainnet")
-            return provider
+        # Connect to the long-lived Avalanche fork, starting it if needed
+        provider = FORK.start()
+        print("Connected to Avalanche mainnet")
+        return provider
     except Exception as e:
         raise Exception(f"Failed to connect to Avalanche network: {str(e)}")
 
@@ -55,7 +59,7 @@ def load_router_contract(router_address: str):
         Exception: If loading the router contract fails.
     """
     try:
-        router_contract = Contract(address=router_address)
+        router_contract = get_contract(router_address)
         print(f"Loaded router contract at address: {router_contract.address}")
         return router_contract
     except Exception as e:
@@ -76,20 +80,8 @@ def load_token_contracts(token1_address, token2_address):
         Exception: If loading the token contracts fails.
     """
     try:
-        token1_contract = Contract(token1_address)
-        token2_contract = Contract(token2_address)
-        
-        token1 = {
-            "address": token1_contract.address,
-            "symbol": token1_contract.symbol(),
-            "decimals": token1_contract.decimals(),
-        }
-        
-        token2 = {
-            "address": token2_contract.address,
-            "symbol": token2_contract.symbol(),
-            "decimals": token2_contract.decimals(),
-        }
+        # Symbols and decimals come from the token cache, uncached tokens are read in a single multicall
+        token1, token2 = get_token_metadata([token1_address, token2_address])
         
         print(f"Loaded token1: {token1}")
         print(f"Loaded token2: {token2}")
@@ -116,21 +108,22 @@ def approve_tokens(account, token, router_address, amount):
         if account.balance < 1e16:  # 0.01 AVAX
             return ("Not enough gas to perform the transaction")
 
-        token_ = Contract(token["address"])
+        token_ = get_contract(token["address"])
 
         # Check if there's enough of token1 to be traded
         token_balance = token_.balanceOf(account.address)
         if token_balance < amount:
-            return (f"Not enough {token_.symbol()} to trade. Balance: {token_balance}, Required: {amount}")
+            return (f"Not enough {token['symbol']} to trade. Balance: {token_balance}, Required: {amount}")
 
-        # Approve the router to spend the maximum amount of tokens
-        max_amount = 2**256 - 1
-        tx = token_.approve(router_address, max_amount, sender=account)
-        return (f"Approved {token_.symbol()} for trading. Transaction hash: {tx.txn_hash}")
+        # Approve the router to spend the maximum amount of tokens, unless an earlier approval still covers it
+        tx = ensure_allowance(account, token["address"], router_address, amount)
+        if tx is None:
+            return (f"{token['symbol']} already approved for trading")
+        return (f"Approved {token['symbol']} for trading. Transaction hash: {tx.txn_hash}")
     except Exception as e:
         return (f"Error in approve_tokens: {str(e)}")
 
-def execute_swap(account, router_contract, token_in, token_out, amount_in, min_amount_out, deadline):
+def execute_swap(account, router_contract, token_in, token_out, amount_in, min_amount_out, deadline, path=None):
     """
     Execute a token swap.
 
@@ -142,6 +135,7 @@ def execute_swap(account, router_contract, token_in, token_out, amount_in, min_a
         amount_in (int): The amount of input tokens.
         min_amount_out (int): The minimum amount of output tokens.
         deadline (int): The deadline for the swap.
+        path (list, optional): The token addresses of the swap path. Defaults to routing through WAVAX.
 
     Returns:
         str: A message indicating the result of the swap execution.
@@ -155,7 +149,7 @@ def execute_swap(account, router_contract, token_in, token_out, amount_in, min_a
         tx = router_contract.swapExactTokensForTokens(
             amount_in,
             min_amount_out,
-            [token_in["address"], NATIVE_TOKEN_ADDRESS, token_out["address"]],
+            path or [token_in["address"], NATIVE_TOKEN_ADDRESS, token_out["address"]],
             account.address,
             deadline,
             sender=account
@@ -168,6 +162,10 @@ def find_arbitrage(account, router_contract, token0_address, token1_address):
     """
     Find arbitrage opportunities.
 
+    The profit-maximizing trade size is solved off-chain from the reserves of the route's pairs, treating
+    token0 and token1 as worth the same, and only trades whose profit covers the current gas cost are
+    pursued. The chain is only quoted again to verify the trade right before it is executed.
+
     Args:
         account: The account object.
         router_contract: The router contract object.
@@ -177,58 +175,79 @@ def find_arbitrage(account, router_contract, token0_address, token1_address):
     Returns:
         str: A message indicating the result of the arbitrage search.
     """
-    native_token = Contract(NATIVE_TOKEN_ADDRESS)
-    token0, token1 = load_token_contracts(token1_address=token0_address, token2_address=token1_address)
-    
-    for _ in tqdm(range(MAX_ITERATIONS), desc="Searching for arbitrage"):
-        try:
-            qty_out = router_contract.getAmountsOut(
-                10**token0['decimals'],
-                [token0['address'], native_token.address, token1['address']]
-            )[-1] / 10**token1['decimals']
-            
-            
-            if 1.01 <= qty_out < 2.00:
-                print(f"\nArbitrage opportunity found!")
-                print(f"{datetime.now().strftime('[%I:%M:%S %p]')} {token0['symbol']} -> {token1['symbol']}: ({qty_out:.3f})")
-                
-                # Execute the swap
-                amount_in = 10**token0['decimals']
-                min_amount_out = int(qty_out * 0.99 * 10**token1['decimals'])  # 1% slippage
-                deadline = int(datetime.now().timestamp()) + 300  # 5 minutes from now
-                
-                print(f"Executing swap with parameters: amount_in={amount_in}, min_amount_out={min_amount_out}, path=[{token0['symbol']}, {native_token.symbol()}, {token1['symbol']}], deadline={deadline}")
-                swap_result = execute_swap(account, router_contract, token0, token1, amount_in, min_amount_out, deadline)
-                
-                if swap_result:
-                    print("Swap executed successfully")
-                else:
-                    print("Swap failed")
-                
-                return f"Successful swap. Here are the results: {swap_result}"
-        
-        except Exception as e:
-            return (f"\nError occurred in finding arbitrage (find_arbitrage): {str(e)}")
-    
-    return ("\nNo arbitrage opportunities found after MAX_ITERATIONS")
+    try:
+        token0, token1 = load_token_contracts(token1_address=token0_address, token2_address=token1_address)
+        path = [token0['address'], NATIVE_TOKEN_ADDRESS, token1['address']]
+
+        # Read the reserves of every hop once, in a single multicall
+        pairs = fetch_path_reserves(router_contract, path)
+        if pairs is None:
+            return ("\nNo liquidity for this route on the router")
+
+        # Express the output in token0 units, so the route can be solved like a cycle back to token0
+        reserves_in, reserves_out = route_reserves(path, pairs)
+        reserves_out[-1] *= 10**(token0['decimals'] - token1['decimals'])
+        amounts_in, profits = optimal_amount_in([reserves_in], [reserves_out], [[pair.fee_bps for pair in pairs]])
+        amount_in = int(amounts_in[0])
+        if amount_in == 0:
+            return ("\nNo arbitrage opportunities found")
+
+        # The first hop is the token0/WAVAX pair, so the gas cost is priced in token0 without another RPC
+        gas_cost = quote(GAS_ORACLE.gas_cost(estimate_swap_gas(hops=len(pairs))), pairs[0], NATIVE_TOKEN_ADDRESS)
+        if profits[0] <= gas_cost:
+            return (f"\nNo arbitrage opportunities found with a profit above the gas cost of {gas_cost / 10**token0['decimals']} {token0['symbol']}")
+
+        expected_amount_out = get_amounts_out(amount_in, path, pairs)
+        qty_out = (expected_amount_out / 10**token1['decimals']) / (amount_in / 10**token0['decimals'])
+        if qty_out >= MAX_RATE:
+            return ("\nNo arbitrage opportunities found")
+
+        # Verify against the router right before executing, in case the reserves moved
+        amount_out = router_contract.getAmountsOut(amount_in, path)[-1]
+        if amount_out < expected_amount_out * 0.99:
+            return ("\nArbitrage opportunity disappeared before execution")
+
+        print(f"\nArbitrage opportunity found!")
+        print(f"{datetime.now().strftime('[%I:%M:%S %p]')} {token0['symbol']} -> {token1['symbol']}: ({qty_out:.3f})")
+
+        # Execute the swap
+        min_amount_out = int(amount_out * 0.99)  # 1% slippage
+        deadline = int(datetime.now().timestamp()) + 300  # 5 minutes from now
+
+        print(f"Executing swap with parameters: amount_in={amount_in}, min_amount_out={min_amount_out}, path=[{token0['symbol']}, WAVAX, {token1['symbol']}], deadline={deadline}")
+        swap_result = execute_swap(account, router_contract, token0, token1, amount_in, min_amount_out, deadline)
+
+        if swap_result:
+            print("Swap executed successfully")
+        else:
+            print("Swap failed")
+
+        return f"Successful swap. Here are the results: {swap_result}"
+
+    except Exception as e:
+        return (f"\nError occurred in finding arbitrage (find_arbitrage): {str(e)}")
 
-def find_arbitrage_traderjoe(token1_address: str, token2_address: str):
+def find_arbitrage_traderjoe(token1_address: str, token2_address: str, router_address: str = ROUTER_ADDRESS,
+                             session=FORK):
     """
     Find arbitrage opportunities within TraderJoe for two given tokens on the Avalanche network.
 
     Args:
         token1_address (str): The contract address of the first token.
         token2_address (str): The contract address of the second token.
+        router_address (str, optional): The router to trade on. Defaults to the TraderJoe V1 router.
+        session (ForkSession, optional): The session to run on, anything whose `use()` yields a connected
+            provider. Defaults to the shared Avalanche fork.
 
     Returns:
         str: A message indicating the results of the arbitrage search.
     """
-    with networks.parse_network_choice("avalanche:mainnet-fork:foundry") as provider:
+    with session.use() as provider:
         # Impersonate an account
         account = impersonate_account()
 
-        # Load Sushiswap router contract
-        router_contract = load_router_contract(router_address=ROUTER_ADDRESS)
+        # Load TraderJoe router contract
+        router_contract = load_router_contract(router_address=router_address)
 
         # Load token contracts
         token0, token1 = load_token_contracts(token1_address, token2_address)
@@ -133,6 +133,19 @@ class CancelOrderByIdInput(BaseModel):
 class FindArbitrageSushiswapInput(BaseModel):
     token1_address: str = Field(description="The contract address of the first token")
     token2_address: str = Field(description="The contract address of the second token")
+
+class ScanArbitrageInput(BaseModel):
+    token_pairs: list[list[str]] = Field(description="The watchlist of token pairs to scan. Each pair is a list of two token contract addresses on the Avalanche network, eg: [[\"0x...\", \"0x...\"], [\"0x...\", \"0x...\"]]")
+    max_results: int = Field(default=10, description="The number of best opportunities to return")
+
+    @validator('token_pairs', allow_reuse=True)
+    def check_token_pairs(cls, value):
+        if not value:
+            raise ValueError("The watchlist cannot be empty!")
+        for token_pair in value:
+            if len(token_pair) != 2 or any(not address.startswith("0x") for address in token_pair):
+                raise ValueError(f"Invalid token pair: {token_pair}. Each pair must be two contract addresses starting with 0x")
+        return value
     
 
 class PredictProfitInput(BaseModel):
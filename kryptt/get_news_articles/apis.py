@@ -1,11 +1,13 @@
 # Imports 
 import os
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from pprint import pprint
 from dotenv import load_dotenv
-from pyyoutube import Client
 from newscatcherapi_client import Newscatcher, ApiException
 from utilities import generate_unique_id
+from articles import parse_published
+from mongodb import get_source_state, save_source_state
 from loguru import logger
 
 # Environmental Variables
@@ -15,122 +17,108 @@ COUNTRIES = "AD, AE, AF, AG, AI, AL, AM, AO, AQ, AR, AS, AT, AU, AW, AX, AZ, BA,
 
 LANG = "af,ar,bg,bn,ca,cs,cy,cn,da,de,el,en,es,et,fa,fi,fr,gu,he,hi,hr,hu,id,it,ja,kn,ko,lt,lv,mk,ml,mr,ne,nl,no,pa,pl,pt,ro,ru,sk,sl,so,sq,sv,sw,ta,te,th,tl,tr,tw,uk,ur,vi"
 
+# Newscatcher ingestion
+NEWSCATCHER_SOURCE = "newscatcher"
+NEWSCATCHER_PAGE_SIZE = 100
+NEWSCATCHER_MAX_PAGES = 10  # Pages requested per run, bounding the API quota consumed
+NEWSCATCHER_MAX_CONCURRENT_REQUESTS = 3  # Concurrent page requests allowed by the plan's rate limit
+NEWSCATCHER_DEFAULT_LOOKBACK = timedelta(days=30)  # Window used before anything has been ingested
+
+# The article fields which are actually stored
+NEWSCATCHER_FIELDS = (
+    "title", "author", "published_date", "link", "domain_url", "name_source", "country",
+    "language", "media", "description", "content", "word_count", "rank",
+)
+
+# Watermark fetched but not yet persisted. Only committed once the articles are uploaded
+_pending_newscatcher_watermark = {}
+
+def fetch_newscatcher_page(newscatcher: Newscatcher, page: int, from_: str):
+    return newscatcher.search.get(q="DeFi, Cryptocurrency, NFTs",
+        search_in="content, summary, title",
+        lang=LANG,
+        sort_by="date", # most recent articles are grabbed first
+        page=page,
+        page_size=NEWSCATCHER_PAGE_SIZE,
+        countries=COUNTRIES,
+        from_=from_,
+        is_paid_content= False,
+    )
+
 def get_news_from_newscatcher() -> list:
     """
-    Retrieves news articles from the Newscatcher API.
-    Returns a list of news articles.
-    Raises ApiException if the API request fails.
+    Retrieves the news articles published since the last run from the Newscatcher API.
+
+    The newest `published_date` ingested so far is kept as a high-watermark and used as the start of
+    the search window, so each run only requests new articles. Every page of the window is fetched,
+    the pages after the first concurrently, up to `NEWSCATCHER_MAX_PAGES`. Results are sorted newest
+    first, so a window with more pages than that is read from its last, oldest pages instead; the
+    watermark then only moves past articles that were actually fetched and later runs catch up.
+
+    Returns:
+        list: A list of news articles holding only the `NEWSCATCHER_FIELDS`.
     """
     
     logger.debug("Setting up Newscatcher API client")   
     # Newscatcher API
     newscatcher = Newscatcher(api_key=os.getenv('NEWS_API_KEY'))
+
+    watermark = parse_published(get_source_state(NEWSCATCHER_SOURCE).get('watermark'))
+    from_ = (watermark or datetime.now(timezone.utc) - NEWSCATCHER_DEFAULT_LOOKBACK).strftime('%Y/%m/%d %H:%M:%S')
+    logger.debug(f"Requesting Newscatcher articles published since {from_}")
     
     try:
-        response = newscatcher.search.get(q="DeFi, Cryptocurrency, NFTs",
-            search_in="content, summary, title",
-            lang=LANG,
-            sort_by="date", # most recent articles are grabbed first
-            page=1,
-            countries=COUNTRIES,
-            from_= (datetime.now() - timedelta(days=30)).strftime('%Y/%m/%d'), # changed the timeframe to 30 days from 182 days
-            is_paid_content= False,
-        )
+        first_page = fetch_newscatcher_page(newscatcher, 1, from_)
         
         logger.debug("Received response from Newscatcher API")
-        
-        if response.status == "ok":
-            logger.debug("Response status is ok, processing articles")
-            newscatcher_articles = [
-                {
-                    "data_id": generate_unique_id(article['link']),
-                    "title": article['title'],
-                    "author": article['author'],
-                    "authors": article['authors'],
-                    "journalists": article['journalists'],
-                    "published_date": article['published_date'],
-                    "published_date_precision": article['published_date_precision'],
-                    "updated_date": article['updated_date'],
-                    "updated_date_precision": article['updated_date_precision'],
-                    "link": article['link'],
-                    "domain_url": article['domain_url'],
-                    "full_domain_url": article['full_domain_url'],
-                    "name_source": article['name_source'],
-                    "is_headline": article['is_headline'],
-                    "paid_content": article['paid_content'],
-                    "parent_url": article['parent_url'],
-                    "country": article['country'],
-                    "rights": article['rights'],
-                    "rank": article['rank'],
-                    "media": article['media'],
-                    "language": article['language'],
-                    "description": article['description'],
-                    "content": article['content'],
-                    "word_count": article['word_count'],
-                    "is_opinion": article['is_opinion'],
-                    "twitter_account": article['twitter_account'],
-                    "all_links": article['all_links'],
-                    "all_domain_links": article['all_domain_links'],
-                    "score": article['score']
-                } for article in response.articles
-            ]
-            logger.debug("Processed articles, returning the list")
-            return newscatcher_articles
+        if first_page.status != "ok":
+            return []
+
+        available_pages = getattr(first_page, 'total_pages', 1) or 1
+        if available_pages > NEWSCATCHER_MAX_PAGES:
+            logger.warning(f"{available_pages} pages are available but only the oldest {NEWSCATCHER_MAX_PAGES} are fetched")
+            pages, responses = range(available_pages - NEWSCATCHER_MAX_PAGES + 1, available_pages + 1), []
+        else:
+            pages, responses = range(2, available_pages + 1), [first_page]
+        if pages:
+            with ThreadPoolExecutor(max_workers=NEWSCATCHER_MAX_CONCURRENT_REQUESTS) as executor:
+                responses += executor.map(lambda page: fetch_newscatcher_page(newscatcher, page, from_), pages)
     except ApiException as e:
         logger.error(f"Error: {e}")
         if e.status in [422, 403]:
             pprint(e.body)
-    
-    logger.debug("Returning empty list due to API error")
-    return []
+        logger.debug("Returning empty list due to API error")
+        return []
 
+    logger.debug(f"Processing articles from {len(responses)} pages")
+    newscatcher_articles, published_dates = [], []
+    for response in responses:
+        if response.status != "ok":
+            # Pages are newest first, so only the pages after a failed one are contiguous with the watermark
+            logger.warning(f"A Newscatcher page failed with status {response.status}, its articles are fetched again next run")
+            published_dates = []
+            continue
+        for article in response.articles:
+            published = parse_published(article.get('published_date'))
+            # The window start is inclusive, so skip what the previous run already stored. Articles without
+            # a readable date are kept, the data_id index deduplicates them
+            if watermark is not None and published is not None and published <= watermark:
+                continue
+            newscatcher_articles.append({
+                "data_id": generate_unique_id(article['link']),
+                **{field: article.get(field) for field in NEWSCATCHER_FIELDS}
+            })
+            if published is not None:
+                published_dates.append((published, article['published_date']))
 
-def extract_youtube_videos() -> list:
+    if published_dates:
+        _pending_newscatcher_watermark['watermark'] = max(published_dates)[1]
+    logger.debug(f"Processed {len(newscatcher_articles)} new articles, returning the list")
+    return newscatcher_articles
+
+def commit_newscatcher_watermark():
     """
-    Extracts YouTube videos related to crypto news.
-    
-    Returns:
-    list: A list of dictionaries containing video information.
+    Persists the newest published date of the last Newscatcher fetch as the start of the next window.
     """
-    logger.debug("Entering extract_youtube_videos function")
-    
-    try:
-        logger.debug("Creating YouTube API client")
-        client = Client(api_key=os.getenv('YOUTUBE_API_KEY'))
-        
-        logger.debug("Searching for YouTube videos with 'crypto news' query")
-        search_results = client.search.list(
-            q="crypto news",
-            part='snippet',
-            maxResults=50,
-            order="date",
-            relevance_language="en",
-            type="video",
-            video_caption="closedCaption",
-            published_after=datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).isoformat() + 'Z',
-        )
-        
-        logger.debug("Processing search results")
-        video_list = [
-            {
-                "channel_id": video.snippet.channelId,
-                "channel_title": video.snippet.channelTitle,
-                "data_id": generate_unique_id(f"https://www.youtube.com/watch?v={video.id.videoId}"),
-                "video_url": f"https://www.youtube.com/watch?v={video.id.videoId}",
-                "title": video.snippet.title,
-                "description": video.snippet.description,
-                "published_date": video.snippet.publishedAt,
-                "thumbnail": video.snippet.thumbnails.default.url
-            } for video in search_results.items
-        ]
-        
-        logger.debug("Returning video list")
-        return video_list
-    except Exception as e:
-        logger.error(f"Error: {e}")
-    logger.debug("Returning empty list due to error")
-    return []
-
-# Example usage
-youtube_link = extract_youtube_videos()
-logger.info(youtube_link)
\ No newline at end of file
+    if _pending_newscatcher_watermark:
+        save_source_state(NEWSCATCHER_SOURCE, {'watermark': _pending_newscatcher_watermark.pop('watermark')})
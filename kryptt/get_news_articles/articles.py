@@ -0,0 +1,107 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from loguru import logger
+
+# Name of the collection holding every article in the normalized schema, read by the UI as config.ARTICLES_COLLECTION
+ARTICLES_COLLECTION = "articles"
+
+# Maps each source collection's own field names onto the normalized article schema
+SOURCE_FIELDS = {
+    "rekt_news": {
+        "title": "title",
+        "url": "link",
+        "thumbnail": "image",
+        "summary": "summary",
+        "published": "publication_date",
+    },
+    "crypto_news": {
+        "title": "title",
+        "url": "link",
+        "thumbnail": "media_thumbnail",
+        "summary": "summary",
+        "published": "published",
+    },
+    "newscatcher_news": {
+        "title": "title",
+        "url": "link",
+        "thumbnail": "media",
+        "summary": "description",
+        "published": "published_date",
+    },
+    "youtube_news": {
+        "title": "title",
+        "url": "video_url",
+        "thumbnail": "thumbnail",
+        "summary": "description",
+        "published": "published_date",
+    },
+}
+
+# Indexes backing the feed, per-source date range filtering and cross-source dedupe
+ARTICLE_INDEXES = [
+    ([("published_at", -1), ("_id", -1)], {"name": "feed"}),
+    ([("published_at", -1), ("source", 1)], {"name": "published_at_source"}),
+    ([("source", 1), ("data_id", 1)], {"name": "source_data_id", "unique": True}),
+]
+
+
+def parse_published(value) -> datetime | None:
+    """
+    Parses the publication date formats used by the news sources into a UTC datetime.
+
+    Args:
+        value: An RFC 822 date (RSS feeds), an ISO 8601 date (YouTube, Newscatcher) or a datetime.
+
+    Returns:
+        datetime | None: A timezone aware UTC datetime, or None if the value cannot be parsed.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    elif not value:
+        return None
+    elif not isinstance(value, str):
+        logger.warning(f"Unable to parse publication date: {value!r}")
+        return None
+    else:
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            try:
+                parsed = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                logger.warning(f"Unable to parse publication date: {value}")
+                return None
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def normalize_article(source: str, data_point: dict) -> dict:
+    """
+    Converts a data point from one of the source collections into the normalized article schema.
+
+    Args:
+        source (str): The name of the source collection, e.g. "rekt_news".
+        data_point (dict): The data point as stored in the source collection.
+
+    Returns:
+        dict: The article with `data_id`, `source`, `title`, `url`, `thumbnail`, `summary`, `published_at` and
+            `duplicate_of`, the `data_id` of the article it is a near-duplicate of. Without a readable
+            publication date, `published_at` falls back to when the data point was stored, so the article
+            still has a place in the feed.
+    """
+    fields = SOURCE_FIELDS[source]
+    published_at = parse_published(data_point.get(fields["published"]))
+    if published_at is None:
+        published_at = data_point["_id"].generation_time if "_id" in data_point else datetime.now(timezone.utc)
+    return {
+        "data_id": data_point["data_id"],
+        "source": source,
+        "title": data_point.get(fields["title"]),
+        "url": data_point.get(fields["url"]),
+        "thumbnail": data_point.get(fields["thumbnail"]),
+        "summary": data_point.get(fields["summary"]),
+        "published_at": published_at,
+        "duplicate_of": data_point.get("duplicate_of"),
+    }
@@ -0,0 +1,90 @@
+"""
+One-off migration from the old 6-digit data_id to the 128-bit content ID.
+
+Recomputes `data_id` from each data point's link, keeps the previous value in `legacy_data_id` and
+re-keys the matching row in the normalized articles collection. Data points that have already been
+migrated are skipped, so the script can be re-run after an interruption.
+
+Pass --reembed to also clear `date_of_embedding` so the embedding job re-uploads every data point to
+Pinecone under its new ID. Vectors stored under the old random IDs should then be removed from the
+index (e.g. by recreating it).
+"""
+import sys
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from loguru import logger
+from articles import ARTICLES_COLLECTION, SOURCE_FIELDS
+from mongodb import BATCH_SIZE, db
+from utilities import generate_unique_id
+
+logger.add('app.log', format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}")
+
+
+def write_batch(collection_name: str, source_operations: list, article_operations: list) -> int:
+    """
+    Writes one batch of source updates, then re-keys the articles whose source update succeeded.
+
+    Args:
+        collection_name (str): The name of the source collection being migrated.
+        source_operations (list): The updates of the source data points.
+        article_operations (list): The matching article updates, at the same positions.
+
+    Returns:
+        int: The number of data points migrated.
+    """
+    try:
+        db[collection_name].bulk_write(source_operations, ordered=False)
+    except BulkWriteError as e:
+        # Two links which canonicalize to the same URL are the same article; the later one keeps its old ID
+        failed = {error["index"] for error in e.details["writeErrors"]}
+        logger.warning(f"{len(failed)} duplicate data points left unmigrated in {collection_name}")
+        article_operations = [
+            operation for index, operation in enumerate(article_operations) if index not in failed
+        ]
+    if article_operations:
+        db[ARTICLES_COLLECTION].bulk_write(article_operations, ordered=False)
+    return len(article_operations)
+
+
+def migrate_collection(collection_name: str, reembed: bool = False):
+    """
+    Migrates the data points of one source collection to the 128-bit content ID.
+
+    Args:
+        collection_name (str): The name of the source collection to migrate.
+        reembed (bool): Whether to clear `date_of_embedding` so the data points are embedded again.
+    """
+    url_field = SOURCE_FIELDS[collection_name]["url"]
+    cursor = db[collection_name].find(
+        {"legacy_data_id": {"$exists": False}},
+        {"data_id": 1, url_field: 1}
+    ).batch_size(BATCH_SIZE)
+
+    source_operations, article_operations, migrated = [], [], 0
+    for data_point in cursor:
+        if not data_point.get(url_field):
+            continue
+        legacy_id = data_point.get("data_id")
+        new_id = generate_unique_id(data_point[url_field])
+
+        update = {"$set": {"data_id": new_id, "legacy_data_id": legacy_id}}
+        if reembed:
+            update["$unset"] = {"date_of_embedding": ""}
+        source_operations.append(UpdateOne({"_id": data_point["_id"]}, update))
+        article_operations.append(
+            UpdateOne({"source": collection_name, "data_id": legacy_id}, {"$set": {"data_id": new_id}})
+        )
+
+        if len(source_operations) == BATCH_SIZE:
+            migrated += write_batch(collection_name, source_operations, article_operations)
+            source_operations, article_operations = [], []
+
+    if source_operations:
+        migrated += write_batch(collection_name, source_operations, article_operations)
+
+    logger.info(f"Migrated {migrated} data points in {collection_name}")
+
+
+if __name__ == "__main__":
+    for collection_name in SOURCE_FIELDS:
+        migrate_collection(collection_name, reembed="--reembed" in sys.argv)
@@ -1,5 +1,6 @@
 # MongoDB
-from pymongo.errors import PyMongoError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 
@@ -10,6 +11,9 @@ import os
 # Importing logger from loguru
 from loguru import logger
 
+# Normalized article schema
+from articles import ARTICLES_COLLECTION, ARTICLE_INDEXES, SOURCE_FIELDS, normalize_article
+
 # Environmental Variables
 load_dotenv('.env')
 
@@ -33,31 +37,179 @@ except Exception as e:
 # Setting up the database
 db = client['crypt']
 
-def upload_to_mongodb(collection_name: str, data: list):
+# Number of data points sent to MongoDB per bulk write
+BATCH_SIZE = 500
+
+# Collections whose unique data_id index has already been ensured by this process
+_indexed_collections = set()
+
+def ensure_data_id_index(collection_name: str):
     """
-    Uploads a list of article data to a specified MongoDB collection, avoiding duplicates based on article_id.
+    Creates the unique index on `data_id` that deduplicates a collection. Only runs once per process.
+
+    Args:
+        collection_name (str): The name of the MongoDB collection to index.
+    """
+    if collection_name in _indexed_collections:
+        return
+    db[collection_name].create_index("data_id", unique=True, name="data_id_unique")
+    _indexed_collections.add(collection_name)
+    logger.debug(f"Ensured unique data_id index on {collection_name}")
+
+def upload_to_mongodb(collection_name: str, data: list, batch_size: int = BATCH_SIZE, update_existing: bool = False) -> dict:
+    """
+    Upserts a list of data points into a specified MongoDB collection, deduplicating on `data_id`.
+
+    Data points are written in unordered bulk upserts of `batch_size`, relying on the unique `data_id`
+    index rather than reading the existing ids back, so the cost of a run depends on the size of the
+    data rather than the size of the collection.
 
     Args:
         collection_name (str): The name of the MongoDB collection to upload to.
-        article_data (list): A list of dictionaries, each containing article data with an 'article_id' field.
+        data (list): A list of dictionaries, each containing a 'data_id' field.
+        batch_size (int): The number of data points sent per bulk write.
+        update_existing (bool): Whether data points that already exist are overwritten. If False they are skipped.
 
     Returns:
-        None
+        dict: The number of data points that were `inserted`, `updated`, `skipped` and `failed` to be written.
     """
+    counts = {"inserted": 0, "updated": 0, "skipped": 0, "failed": 0}
     mongodb_collection = db[collection_name]
 
-    existing_ids = set(mongodb_collection.distinct("data_id"))
-    
-    logger.debug(f"Inserting data into {collection_name}...")
-    data_to_insert = [data_point for data_point in data if data_point["data_id"] not in existing_ids]
-    
-    if data_to_insert:
+    try:
+        ensure_data_id_index(collection_name)
+    except PyMongoError as e:
+        logger.error(f"Unable to create data_id index on {collection_name}: {e}")
+        counts["failed"] = len(data)
+        return counts
+
+    logger.debug(f"Upserting {len(data)} data points into {collection_name}...")
+    for start in range(0, len(data), batch_size):
+        batch = data[start:start + batch_size]
+        operations = [
+            UpdateOne(
+                {"data_id": data_point["data_id"]},
+                # An overwritten data point is queued for embedding again, which skips it if its content is unchanged
+                {"$set": data_point, "$unset": {"date_of_embedding": ""}} if update_existing else {"$setOnInsert": data_point},
+                upsert=True
+            )
+            for data_point in batch
+        ]
+
         try:
-            mongodb_collection.insert_many(data_to_insert)
-            logger.info(f"Inserted {len(data_to_insert)} data points.")
+            result = mongodb_collection.bulk_write(operations, ordered=False).bulk_api_result
+        except BulkWriteError as e:
+            # Duplicate keys from a concurrent writer mean the data point is already stored
+            result = e.details
+            duplicates = sum(1 for error in result["writeErrors"] if error["code"] == 11000)
+            counts["skipped"] += duplicates
+            counts["failed"] += len(result["writeErrors"]) - duplicates
+            if duplicates < len(result["writeErrors"]):
+                logger.error(f"PyMongo error: {result['writeErrors']}")
         except PyMongoError as e:
             logger.error(f"PyMongo error: {e}")
-        except Exception as e:
-            logger.error(f"General error: {e}")
-    else:
-        logger.info("No new data points to insert.")
\ No newline at end of file
+            counts["failed"] += len(batch)
+            continue
+
+        counts["inserted"] += result["nUpserted"]
+        counts["updated"] += result["nModified"]
+        counts["skipped"] += result["nMatched"] - result["nModified"]
+
+        # Keep the normalized articles collection in step with whatever changed
+        changed = batch if update_existing else [batch[upserted["index"]] for upserted in result["upserted"]]
+        upsert_articles(collection_name, changed)
+
+    logger.info(f"{collection_name}: inserted {counts['inserted']}, updated {counts['updated']}, skipped {counts['skipped']}, failed {counts['failed']} data points.")
+    return counts
+
+# Per-source ingestion state (feed ETags, watermarks, ...) keyed by source name
+SOURCE_STATE_COLLECTION = "source_state"
+
+def get_source_state(name: str) -> dict:
+    """
+    Retrieves the persisted ingestion state of a source.
+
+    Args:
+        name (str): The name of the source, e.g. a feed URL.
+
+    Returns:
+        dict: The stored state, or an empty dict if the source has none yet.
+    """
+    state = db[SOURCE_STATE_COLLECTION].find_one({"_id": name}, {"_id": 0})
+    return state or {}
+
+def save_source_state(name: str, state: dict):
+    """
+    Persists the ingestion state of a source, merging it into any state already stored.
+
+    Args:
+        name (str): The name of the source, e.g. a feed URL.
+        state (dict): The fields of the state to store.
+    """
+    db[SOURCE_STATE_COLLECTION].update_one({"_id": name}, {"$set": state}, upsert=True)
+    logger.debug(f"Saved ingestion state for {name}")
+
+def ensure_article_indexes():
+    """
+    Creates the indexes on the normalized articles collection. Safe to call repeatedly.
+    """
+    articles_collection = db[ARTICLES_COLLECTION]
+    for keys, options in ARTICLE_INDEXES:
+        articles_collection.create_index(keys, **options)
+    logger.debug(f"Ensured indexes on {ARTICLES_COLLECTION}")
+
+
+def upsert_articles(source: str, data: list):
+    """
+    Writes data points from a source collection into the normalized articles collection.
+
+    Args:
+        source (str): The name of the source collection the data points belong to.
+        data (list): A list of data points as stored in the source collection.
+
+    Returns:
+        None
+    """
+    operations = [
+        UpdateOne(
+            {"source": source, "data_id": article["data_id"]},
+            {"$set": article},
+            upsert=True
+        )
+        for article in (normalize_article(source, data_point) for data_point in data)
+    ]
+
+    if operations:
+        try:
+            result = db[ARTICLES_COLLECTION].bulk_write(operations, ordered=False)
+            logger.info(f"Upserted {result.upserted_count} and updated {result.modified_count} articles from {source}.")
+        except PyMongoError as e:
+            logger.error(f"PyMongo error: {e}")
+
+
+def backfill_articles(batch_size: int = 1000):
+    """
+    Populates the normalized articles collection from every source collection.
+
+    Args:
+        batch_size (int): The number of data points written per bulk write.
+
+    Returns:
+        None
+    """
+    ensure_article_indexes()
+    for source, fields in SOURCE_FIELDS.items():
+        projection = {"data_id": 1, "duplicate_of": 1, **{field: 1 for field in fields.values()}}
+        batch = []
+        for data_point in db[source].find({}, projection).batch_size(batch_size):
+            batch.append(data_point)
+            if len(batch) == batch_size:
+                upsert_articles(source, batch)
+                batch = []
+        if batch:
+            upsert_articles(source, batch)
+        logger.info(f"Backfilled {source} into {ARTICLES_COLLECTION}")
+
+
+if __name__ == "__main__":
+    backfill_articles()
\ No newline at end of file
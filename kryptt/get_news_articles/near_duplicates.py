@@ -0,0 +1,171 @@
+import hashlib
+import re
+import threading
+import numpy as np
+from pymongo import UpdateOne
+from articles import normalize_article
+from mongodb import db
+from loguru import logger
+
+# MinHash signature and LSH banding. 16 bands of 8 rows make pairs above ~0.7 Jaccard similarity likely candidates
+NUM_PERMUTATIONS = 128
+BANDS = 16
+ROWS = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 5  # Words per shingle
+SIMILARITY_THRESHOLD = 0.8  # Estimated Jaccard similarity above which two articles are the same story
+MAX_BUCKET_SIZE = 1000  # Most recent articles kept per LSH bucket, so common bands stay small to store and read
+
+# Collections persisting the LSH index between runs
+BUCKETS_COLLECTION = "lsh_buckets"
+SIGNATURES_COLLECTION = "minhash_signatures"
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Fixed seed so signatures stay comparable with the ones persisted by earlier runs
+_generator = np.random.RandomState(1)
+_PERMUTATIONS_A = _generator.randint(1, _MERSENNE_PRIME, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_PERMUTATIONS_B = _generator.randint(0, _MERSENNE_PRIME, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+# Sources are ingested concurrently, the index is updated by one of them at a time
+_index_lock = threading.Lock()
+
+
+def shingles(text: str) -> set:
+    """
+    Splits text into overlapping word shingles, ignoring HTML tags, case and punctuation.
+    """
+    words = re.findall(r"\w+", re.sub(r"<[^>]+>", " ", text).lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text: str) -> np.ndarray | None:
+    """
+    Computes the MinHash signature of a text, one minimum per permutation, for all shingles at once.
+
+    Returns:
+        np.ndarray | None: NUM_PERMUTATIONS unsigned 64-bit minimum hashes, or None if the text has no words.
+    """
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=4).digest(), "little") for shingle in shingles(text)],
+        dtype=np.uint64
+    )
+    if hashes.size == 0:
+        return None
+
+    permuted = (np.outer(hashes, _PERMUTATIONS_A) + _PERMUTATIONS_B) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=0)
+
+
+def band_keys(signature: np.ndarray) -> list:
+    return [
+        f"{band}:{hashlib.blake2b(signature[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).hexdigest()}"
+        for band in range(BANDS)
+    ]
+
+
+def similarity(signature: np.ndarray, other: np.ndarray) -> float:
+    """Estimates the Jaccard similarity of two texts from their signatures."""
+    return float(np.mean(signature == other))
+
+
+def mark_near_duplicates(source: str, data: list) -> int:
+    """
+    Links data points that tell the same story as an article already seen, from any source.
+
+    Each data point's MinHash signature is looked up in the LSH index persisted in MongoDB. A data
+    point whose estimated similarity with a candidate reaches SIMILARITY_THRESHOLD gets a
+    `duplicate_of` field holding the `data_id` of the cluster's canonical (first seen) article, so
+    only the canonical article is embedded. Every data point is then added to the index, where each
+    bucket only keeps its MAX_BUCKET_SIZE most recent articles.
+
+    Args:
+        source (str): The name of the source collection the data points belong to.
+        data (list): The data points, updated in place.
+
+    Returns:
+        int: The number of data points marked as duplicates.
+    """
+    texts = {
+        data_point["data_id"]: f"{article['title'] or ''} {article['summary'] or ''}"
+        for data_point, article in ((data_point, normalize_article(source, data_point)) for data_point in data)
+    }
+    signatures = {data_id: minhash_signature(text) for data_id, text in texts.items()}
+    # Without any words there is nothing to compare, such data points are left out of the index
+    signatures = {data_id: signature for data_id, signature in signatures.items() if signature is not None}
+    keys = {data_id: band_keys(signature) for data_id, signature in signatures.items()}
+
+    with _index_lock:
+        # Load the buckets touched by this batch and the signatures of every article in them
+        buckets = {
+            bucket["_id"]: bucket["data_ids"] for bucket in
+            db[BUCKETS_COLLECTION].find({"_id": {"$in": sorted({key for band in keys.values() for key in band})}})
+        }
+        candidate_ids = {data_id for data_ids in buckets.values() for data_id in data_ids} | set(signatures)
+        known = {
+            stored["_id"]: stored for stored in
+            db[SIGNATURES_COLLECTION].find({"_id": {"$in": list(candidate_ids)}})
+        }
+        index_signatures = {
+            data_id: np.frombuffer(stored["signature"], dtype=np.uint64) for data_id, stored in known.items()
+        }
+        canonical = {data_id: stored["canonical_id"] for data_id, stored in known.items()}
+
+        duplicates, new_signatures = 0, []
+        for data_point in data:
+            data_id = data_point["data_id"]
+            if data_id not in signatures:
+                continue
+            if data_id in canonical:
+                # Already indexed by an earlier run, keep the cluster it was assigned to
+                match = canonical[data_id] if canonical[data_id] != data_id else None
+            else:
+                candidates = {candidate for key in keys[data_id] for candidate in buckets.get(key, [])}
+                scores = {
+                    candidate: similarity(signatures[data_id], index_signatures[candidate])
+                    for candidate in candidates if candidate in index_signatures
+                }
+                best = max(scores, key=scores.get, default=None)
+                match = canonical[best] if best is not None and scores[best] >= SIMILARITY_THRESHOLD else None
+
+                # Index the data point so the rest of the batch can match it too
+                canonical[data_id] = match or data_id
+                index_signatures[data_id] = signatures[data_id]
+                for key in keys[data_id]:
+                    buckets.setdefault(key, []).append(data_id)
+                new_signatures.append(data_id)
+
+            if match:
+                data_point["duplicate_of"] = match
+                duplicates += 1
+
+        if new_signatures:
+            db[SIGNATURES_COLLECTION].bulk_write([
+                UpdateOne(
+                    {"_id": data_id},
+                    {"$setOnInsert": {
+                        "source": source,
+                        "signature": signatures[data_id].tobytes(),
+                        "canonical_id": canonical[data_id],
+                    }},
+                    upsert=True
+                )
+                for data_id in new_signatures
+            ], ordered=False)
+            bucket_additions = {}
+            for data_id in new_signatures:
+                for key in keys[data_id]:
+                    bucket_additions.setdefault(key, []).append(data_id)
+            db[BUCKETS_COLLECTION].bulk_write([
+                UpdateOne(
+                    {"_id": key},
+                    {"$push": {"data_ids": {"$each": data_ids, "$slice": -MAX_BUCKET_SIZE}}},
+                    upsert=True
+                )
+                for key, data_ids in bucket_additions.items()
+            ], ordered=False)
+
+    logger.info(f"{source}: {duplicates} of {len(data)} data points are near-duplicates of stored articles")
+    return duplicates
@@ -1,22 +1,83 @@
 import feedparser
 from utilities import generate_unique_id
+from mongodb import get_source_state, save_source_state
 from loguru import logger
 
 logger.add('app.log', format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}")
 
+# RSS feeds
+REKT_NEWS_FEED = 'https://rekt.news/rss/feed.xml'
+CRYPTO_NEWS_FEED = 'https://crypto.news/feed/'
+
+# Feed state fetched but not yet persisted, keyed by feed URL. Only committed once the articles are uploaded
+_pending_feed_state = {}
+
+def fetch_new_entries(feed_url: str) -> list:
+    """
+    Fetches an RSS feed with a conditional GET and returns only the entries newer than the last run.
+
+    The ETag and Last-Modified headers from the previous run are sent back, so an unchanged feed is
+    answered with a 304 and never parsed. A changed feed is read newest first up to the last entry
+    seen on the previous run. The new feed state is held until `commit_feed_state` is called.
+
+    Args:
+        feed_url (str): The URL of the RSS feed.
+
+    Returns:
+        list: The feed entries which have not been seen before, newest first.
+    """
+    state = get_source_state(feed_url)
+    feed = feedparser.parse(
+        url_file_stream_or_string=feed_url,
+        etag=state.get('etag'),
+        modified=state.get('modified')
+    )
+
+    # feedparser reports network and HTTP errors on the result instead of raising. Raising here leaves the
+    # stored ETag and Last-Modified in place, so the next run still sends a conditional GET
+    if feed.get('status') is None or feed.status >= 400:
+        raise ConnectionError(f"Unable to fetch {feed_url}: {feed.get('bozo_exception', feed.get('status'))}")
+
+    if feed.get('status') == 304:
+        logger.debug(f"{feed_url} has not changed since the last run")
+        return []
+
+    new_entries = []
+    for entry in feed.entries:
+        if entry.get('id', entry.link) == state.get('last_entry_id'):
+            break
+        new_entries.append(entry)
+
+    _pending_feed_state[feed_url] = {
+        'etag': feed.get('etag', state.get('etag')),
+        'modified': feed.get('modified', state.get('modified')),
+        'last_entry_id': feed.entries[0].get('id', feed.entries[0].link) if feed.entries else state.get('last_entry_id'),
+        'last_published': feed.entries[0].get('published') if feed.entries else state.get('last_published'),
+    }
+    logger.debug(f"{len(new_entries)} of {len(feed.entries)} entries in {feed_url} are new")
+    return new_entries
+
+def commit_feed_state(feed_url: str):
+    """
+    Persists the state of the last fetch of a feed so the next run can skip what it has already seen.
+
+    Args:
+        feed_url (str): The URL of the RSS feed.
+    """
+    if feed_url in _pending_feed_state:
+        save_source_state(feed_url, _pending_feed_state.pop(feed_url))
+
 def get_rekt_news_articles() -> list:
     """
     Fetches and parses the RSS feed from the Rekt News website to extract news articles.
-    
+
     Returns:
         list: A list of dictionaries, each containing details about a Rekt News article such as title, publication date, summary, link, and image URL if available.
     """
-    # URL of the Rekt News RSS feed
-    rekt_news = 'https://rekt.news/rss/feed.xml'
-    # Parse the RSS feed using feedparser
-    feed = feedparser.parse(url_file_stream_or_string=rekt_news)
-    
     logger.debug("Fetching articles from rekt news...")
+    # Only the entries published since the last run
+    entries = fetch_new_entries(REKT_NEWS_FEED)
+
     # Extract relevant information from each article in the feed
     rekt_articles = [
         {
@@ -25,11 +86,11 @@ def get_rekt_news_articles() -> list:
             'publication_date': article.published,  # Publication date of the article
             'summary': article.summary,  # Summary of the article
             'link': article.link,  # URL link to the full article
-            'image': [link['href'] for link in article.links if link.get('rel') == 'enclosure'][0] 
+            'image': [link['href'] for link in article.links if link.get('rel') == 'enclosure'][0]
             if any(link.get('rel') == 'enclosure' for link in article.links) else None  # URL of the image if available
-        } for article in feed.entries
+        } for article in entries
     ]
-    
+
     logger.debug("Extracted relevant information from rekt news")
     return rekt_articles
 
@@ -37,14 +98,14 @@ def get_rekt_news_articles() -> list:
 def get_crypto_news_articles() -> list:
     """
     Fetches and parses the RSS feed from the Crypto News website to extract news articles.
-    
+
     Returns:
         list: A list of dictionaries, each containing details about a Crypto News article such as title, link, author, publication date, tags, id, summary, and media thumbnail URL if available.
     """
-    # Parse the RSS feed from Crypto News using feedparser
-    feed = feedparser.parse(url_file_stream_or_string='https://crypto.news/feed/')
-    
     logger.debug("Fetching articles from crypto.news")
+    # Only the entries published since the last run
+    entries = fetch_new_entries(CRYPTO_NEWS_FEED)
+
     # Extract relevant information from each article in the feed
     article_data = [
         {
@@ -56,8 +117,8 @@ def get_crypto_news_articles() -> list:
             'tags': [tag['term'] for tag in article.tags],  # Tags associated with the article
             'summary': article.summary,  # Summary of the article
             'media_thumbnail': article.media_thumbnail[0]['url'] if 'media_thumbnail' in article else None  # URL of the media thumbnail if available
-        } for article in feed.entries
+        } for article in entries
     ]
-    
+
     logger.debug("Extracted relevant information from crypto news")
-    return article_data
\ No newline at end of file
+    return article_data
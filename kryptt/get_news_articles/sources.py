@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+from typing import Callable
+import rss
+import apis
+import youtube
+
+# Seconds a source may take to fetch before the run gives up on it
+DEFAULT_TIMEOUT = 60
+
+
+@dataclass
+class NewsSource:
+    """
+    A news source ingested by upload_data.
+
+    Attributes:
+        name (str): The name used in logs and metrics.
+        collection (str): The MongoDB collection the fetched data points are uploaded to.
+        fetch (Callable[[], list]): A blocking function returning the source's data points.
+        timeout (float): Seconds the fetch may take before it is abandoned.
+        after_upload (Callable[[], None], optional): Called once every fetched data point is stored,
+            e.g. to persist how far the source has been read. Skipped if any of them failed to upload.
+    """
+    name: str
+    collection: str
+    fetch: Callable[[], list]
+    timeout: float = DEFAULT_TIMEOUT
+    after_upload: Callable[[], None] | None = None
+
+
+# Every source fetched on each ingestion run, keyed by name
+SOURCES: dict[str, NewsSource] = {}
+
+
+def register_source(source: NewsSource) -> NewsSource:
+    """
+    Adds a source to the ingestion registry, replacing any source with the same name.
+
+    Args:
+        source (NewsSource): The source to register.
+
+    Returns:
+        NewsSource: The registered source.
+    """
+    SOURCES[source.name] = source
+    return source
+
+
+register_source(NewsSource(
+    name="rekt_news",
+    collection="rekt_news",
+    fetch=rss.get_rekt_news_articles,
+    after_upload=lambda: rss.commit_feed_state(rss.REKT_NEWS_FEED)
+))
+register_source(NewsSource(
+    name="crypto_news",
+    collection="crypto_news",
+    fetch=rss.get_crypto_news_articles,
+    after_upload=lambda: rss.commit_feed_state(rss.CRYPTO_NEWS_FEED)
+))
+register_source(NewsSource(
+    name="newscatcher_news",
+    collection="newscatcher_news",
+    fetch=apis.get_news_from_newscatcher,
+    after_upload=apis.commit_newscatcher_watermark
+))
+register_source(NewsSource(
+    name="youtube_news",
+    collection="youtube_news",
+    fetch=youtube.extract_youtube_videos,
+    timeout=180,  # Transcripts are fetched one request per video
+    after_upload=youtube.commit_youtube_state
+))
@@ -1,49 +1,128 @@
-import rss
+import asyncio
+import threading
+import time
 import mongodb as mdb
-import apis
+from near_duplicates import mark_near_duplicates
+from sources import SOURCES, NewsSource
 from loguru import logger
 
 # Configure loguru logger
 logger.add('app.log', format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}")
 
-# Error Handling
-try:
-    rekt_news_articles = rss.get_rekt_news_articles()
-    crypto_news_articles = rss.get_crypto_news_articles()
-    newscatcher_news_articles = apis.get_news_from_newscatcher()
-    youtube_videos = apis.extract_youtube_videos()
-except Exception as e:
-    logger.error(f"Error fetching news articles: {e}")
-    raise
+# Make sure the normalized articles collection can be queried by date and source
+mdb.ensure_article_indexes()
 
 # Code Reusability
-def upload_articles_to_db(collection_name, article_data):
+def upload_articles_to_db(collection_name, article_data) -> bool:
+    """Uploads the fetched data points, returning whether every one of them was stored."""
     if article_data:
-        mdb.upload_to_mongodb(collection_name=collection_name, data=article_data)
-        logger.info(f"Uploaded {len(article_data)} articles to {collection_name}")
+        counts = mdb.upload_to_mongodb(collection_name=collection_name, data=article_data)
+        logger.info(f"Uploaded {counts['inserted']} new articles to {collection_name}")
+        return counts["failed"] == 0
+    logger.warning(f"No new {collection_name} data can be found")
+    return True
+
+def _resolve(future: asyncio.Future, result=None, exception: BaseException = None):
+    # The fetch may finish after its timeout cancelled the future
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
     else:
-        logger.warning(f"No new {collection_name} data can be found")
-
-# Upload rekt news articles
-upload_articles_to_db(
-    collection_name="rekt_news",
-    article_data=rekt_news_articles
-)
-
-# Upload crypto news articles
-upload_articles_to_db(
-    collection_name="crypto_news", 
-    article_data=crypto_news_articles
-)
-
-# Upload newscatcher news articles
-upload_articles_to_db(
-    collection_name="newscatcher_news",
-    article_data=newscatcher_news_articles
-)
-
-# Upload youtube videos
-upload_articles_to_db(
-    collection_name="youtube_news",
-    article_data=youtube_videos
-)
\ No newline at end of file
+        future.set_result(result)
+
+def run_in_daemon_thread(function) -> asyncio.Future:
+    """
+    Runs a blocking function in its own daemon thread and returns a future of its result.
+
+    Unlike `asyncio.to_thread`, the thread is not part of the loop's default executor, which `asyncio.run`
+    joins on exit, and being a daemon it does not hold up interpreter exit either. A fetch abandoned after
+    its timeout is therefore leaked rather than waited for: its thread keeps running until the request
+    returns on its own or the process exits.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def run():
+        try:
+            result, exception = function(), None
+        except BaseException as e:
+            result, exception = None, e
+        try:
+            loop.call_soon_threadsafe(_resolve, future, result, exception)
+        except RuntimeError:
+            pass  # The run already finished and closed its loop
+
+    threading.Thread(target=run, name=f"fetch-{getattr(function, '__name__', 'source')}", daemon=True).start()
+    return future
+
+async def fetch_source(source: NewsSource) -> dict:
+    """
+    Fetches a single source in a daemon thread, isolating its failures and timeouts from the other sources.
+
+    A source which exceeds its timeout is abandoned, so it bounds the run's wall-clock time even when
+    the underlying request hangs.
+
+    Args:
+        source (NewsSource): The source to fetch.
+
+    Returns:
+        dict: The fetch metrics (`source`, `status`, `seconds`, `items`) and the fetched `data`.
+    """
+    start = time.perf_counter()
+    try:
+        data = await asyncio.wait_for(run_in_daemon_thread(source.fetch), timeout=source.timeout)
+        status = "ok"
+    except asyncio.TimeoutError:
+        logger.error(f"Fetching {source.name} timed out after {source.timeout}s")
+        data, status = [], "timeout"
+    except Exception as e:
+        logger.error(f"Error fetching {source.name}: {e}")
+        data, status = [], "error"
+
+    metrics = {
+        "source": source.name,
+        "status": status,
+        "seconds": round(time.perf_counter() - start, 3),
+        "items": len(data),
+    }
+    logger.info(f"Fetch metrics | source={metrics['source']} status={status} seconds={metrics['seconds']} items={metrics['items']}")
+    return {**metrics, "data": data}
+
+async def ingest_source(source: NewsSource) -> dict:
+    result = await fetch_source(source)
+    data = result.pop("data")
+    try:
+        # Link stories already seen from another source before they are stored
+        if data:
+            await asyncio.to_thread(mark_near_duplicates, source.collection, data)
+        uploaded = await asyncio.to_thread(upload_articles_to_db, source.collection, data)
+        if not uploaded:
+            # The source's read position is left where it was, so the next run fetches the data points again
+            logger.error(f"Some {source.name} data points could not be stored")
+            result["status"] = "error"
+        elif result["status"] == "ok" and source.after_upload:
+            await asyncio.to_thread(source.after_upload)
+    except Exception as e:
+        logger.error(f"Error uploading {source.name}: {e}")
+        result["status"] = "error"
+    return result
+
+async def run_ingestion(sources: list = None) -> list:
+    """
+    Fetches and uploads every registered source concurrently.
+
+    Args:
+        sources (list, optional): The sources to ingest. Defaults to every registered source.
+
+    Returns:
+        list: The fetch metrics of each source.
+    """
+    sources = list(SOURCES.values()) if sources is None else sources
+    start = time.perf_counter()
+    results = await asyncio.gather(*(ingest_source(source) for source in sources))
+    logger.info(f"Ingested {len(sources)} sources in {time.perf_counter() - start:.2f}s")
+    return results
+
+if __name__ == "__main__":
+    asyncio.run(run_ingestion())
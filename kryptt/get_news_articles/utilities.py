@@ -1,15 +1,47 @@
 import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
-def generate_unique_id(link: str) -> int:
+# Query parameters which only track where a click came from and never change the content
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "ref_src", "feature", "si"}
+
+def canonicalize_url(link: str) -> str:
     """
-    Generates a unique integer ID from a given link using SHA-256 hashing.
+    Reduces a link to a canonical form so the same article always yields the same ID.
+
+    The scheme and host are lowercased, a leading "www." and default ports are dropped, tracking
+    query parameters (utm_*, fbclid, ...) and fragments are removed, the remaining query parameters
+    are sorted and any trailing slash on the path is stripped.
 
     Args:
-        link (str): The link to generate a unique ID from.
+        link (str): The link to canonicalize.
 
     Returns:
-        int: A unique integer ID generated from the link.
+        str: The canonical form of the link.
+    """
+    parts = urlsplit(link.strip())
+    scheme = parts.scheme.lower() or "https"
+    host = (parts.hostname or "").removeprefix("www.")
+    if parts.port and (scheme, parts.port) not in {("http", 80), ("https", 443)}:
+        host = f"{host}:{parts.port}"
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+def generate_unique_id(link: str) -> str:
     """
-    return int(hashlib.sha256(link.encode()).hexdigest(), 16) % (10**6)
+    Generates a stable 128-bit content ID from the canonical form of a link.
 
+    The ID is shared by the MongoDB `data_id`, the Pinecone vector ID and the retrieval metadata.
+    At 128 bits collisions are negligible for any realistic number of articles.
 
+    Args:
+        link (str): The link to generate a unique ID from.
+
+    Returns:
+        str: A 32 character hexadecimal ID generated from the link.
+    """
+    return hashlib.blake2b(canonicalize_url(link).encode(), digest_size=16).hexdigest()
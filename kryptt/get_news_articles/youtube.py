@@ -0,0 +1,234 @@
+# Imports
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from pyyoutube import Client
+from utilities import generate_unique_id
+from mongodb import db, get_source_state, save_source_state
+from loguru import logger
+
+# Transcripts are optional, they are only fetched when youtube-transcript-api is installed
+try:
+    from youtube_transcript_api import YouTubeTranscriptApi
+except ImportError:
+    YouTubeTranscriptApi = None
+
+# Environmental Variables
+load_dotenv('.env')
+
+YOUTUBE_SOURCE = "youtube"
+YOUTUBE_COLLECTION = "youtube_news"
+
+# Quota units charged by the YouTube Data API per request
+SEARCH_COST = 100
+VIDEOS_COST = 1
+DAILY_QUOTA = 10_000  # Units granted per day by the default YouTube Data API project
+RUN_QUOTA = 500  # Units a single ingestion run may spend
+MAX_RESULTS = 50  # Largest page the search and videos endpoints return
+
+# Transcript enrichment
+FETCH_TRANSCRIPTS = os.getenv("YOUTUBE_FETCH_TRANSCRIPTS", "true").lower() == "true"
+TRANSCRIPT_WORKERS = 4
+TRANSCRIPT_LANGUAGES = ["en"]
+
+# Search window fetched but not yet persisted. Only committed once the videos are uploaded
+_pending_youtube_state = {}
+
+
+class QuotaTracker:
+    """
+    Tracks the YouTube Data API quota spent today, persisted across runs in the source state.
+
+    Args:
+        run_budget (int): The most units this run may spend.
+        daily_quota (int): The units available per day.
+    """
+
+    def __init__(self, run_budget: int = RUN_QUOTA, daily_quota: int = DAILY_QUOTA):
+        today = datetime.now(timezone.utc).date().isoformat()
+        state = get_source_state(YOUTUBE_SOURCE)
+        self.date = today
+        self.used_today = state.get('quota_used', 0) if state.get('quota_date') == today else 0
+        self.used_this_run = 0
+        self.run_budget = run_budget
+        self.daily_quota = daily_quota
+
+    def can_spend(self, units: int) -> bool:
+        return (self.used_this_run + units <= self.run_budget
+                and self.used_today + units <= self.daily_quota)
+
+    def spend(self, units: int):
+        self.used_this_run += units
+        self.used_today += units
+        save_source_state(YOUTUBE_SOURCE, {'quota_date': self.date, 'quota_used': self.used_today})
+
+
+def search_videos(client: Client, quota: QuotaTracker, published_after: str, published_before: str = None) -> tuple:
+    """
+    Pages through the "crypto news" search results published in a time window, within the quota.
+
+    Returns:
+        tuple: The search result items, newest first, and whether every page of the window was read.
+    """
+    items, page_token = [], None
+    while quota.can_spend(SEARCH_COST):
+        search_results = client.search.list(
+            q="crypto news",
+            part='snippet',
+            maxResults=MAX_RESULTS,
+            order="date",
+            relevance_language="en",
+            type="video",
+            video_caption="closedCaption",
+            published_after=published_after,
+            published_before=published_before,
+            page_token=page_token,
+        )
+        quota.spend(SEARCH_COST)
+        items.extend(search_results.items)
+
+        page_token = search_results.nextPageToken
+        if not page_token:
+            return items, True
+    logger.warning(f"YouTube quota exhausted after {quota.used_this_run} units, remaining pages skipped")
+    return items, False
+
+
+def fetch_video_details(client: Client, quota: QuotaTracker, video_ids: list) -> dict:
+    """
+    Retrieves the duration and statistics of videos, 50 per request.
+
+    Returns:
+        dict: The video resources keyed by video ID.
+    """
+    details = {}
+    for start in range(0, len(video_ids), MAX_RESULTS):
+        if not quota.can_spend(VIDEOS_COST):
+            logger.warning("YouTube quota exhausted, skipping remaining video details")
+            break
+        response = client.videos.list(
+            video_id=",".join(video_ids[start:start + MAX_RESULTS]),
+            parts="contentDetails,statistics",
+        )
+        quota.spend(VIDEOS_COST)
+        details.update({video.id: video for video in response.items})
+    return details
+
+
+def fetch_transcript(video_id: str) -> str | None:
+    try:
+        segments = YouTubeTranscriptApi.get_transcript(video_id, languages=TRANSCRIPT_LANGUAGES)
+        return " ".join(segment['text'] for segment in segments)
+    except Exception as e:
+        logger.debug(f"No transcript for {video_id}: {e}")
+        return None
+
+
+def fetch_transcripts(video_ids: list) -> dict:
+    """
+    Fetches the caption text of videos in a bounded worker pool. Transcripts do not use API quota.
+
+    Returns:
+        dict: The transcript of each video keyed by video ID, None where no transcript is available.
+    """
+    if not FETCH_TRANSCRIPTS or YouTubeTranscriptApi is None:
+        return {}
+    with ThreadPoolExecutor(max_workers=TRANSCRIPT_WORKERS) as executor:
+        return dict(zip(video_ids, executor.map(fetch_transcript, video_ids)))
+
+
+def extract_youtube_videos() -> list:
+    """
+    Extracts YouTube videos related to crypto news published since the last run.
+
+    Search results are paged through within the run's quota budget. Results come newest first, so
+    when the quota runs out the next run resumes the same window before the oldest video fetched, and
+    the start of the search only moves forward once the whole window has been read. Videos already
+    stored are dropped before the details endpoint is called, and the remaining videos are enriched
+    with their duration, statistics and, when enabled, their transcript.
+
+    Returns:
+    list: A list of dictionaries containing video information.
+    """
+    logger.debug("Entering extract_youtube_videos function")
+
+    try:
+        logger.debug("Creating YouTube API client")
+        client = Client(api_key=os.getenv('YOUTUBE_API_KEY'))
+        quota = QuotaTracker()
+
+        state = get_source_state(YOUTUBE_SOURCE)
+        published_after = state.get('published_after') or datetime.now(timezone.utc).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        ).isoformat().replace('+00:00', 'Z')
+        # Set while a window the quota cut short is being resumed, along with the newest video of that window
+        published_before = state.get('published_before')
+        window_newest = state.get('window_newest')
+
+        logger.debug(f"Searching for YouTube videos published after {published_after} and before {published_before}")
+        search_items, complete = search_videos(client, quota, published_after, published_before)
+
+        # Drop videos which are already stored before spending quota on their details
+        candidates = {
+            generate_unique_id(f"https://www.youtube.com/watch?v={video.id.videoId}"): video
+            for video in search_items
+        }
+        known_ids = {
+            doc['data_id'] for doc in
+            db[YOUTUBE_COLLECTION].find({"data_id": {"$in": list(candidates)}}, {"data_id": 1})
+        }
+        new_videos = {data_id: video for data_id, video in candidates.items() if data_id not in known_ids}
+        logger.debug(f"{len(new_videos)} of {len(candidates)} videos are new")
+
+        video_ids = [video.id.videoId for video in new_videos.values()]
+        details = fetch_video_details(client, quota, video_ids)
+        transcripts = fetch_transcripts(video_ids)
+
+        logger.debug("Processing search results")
+        video_list = [
+            {
+                "channel_id": video.snippet.channelId,
+                "channel_title": video.snippet.channelTitle,
+                "data_id": data_id,
+                "video_id": video.id.videoId,
+                "video_url": f"https://www.youtube.com/watch?v={video.id.videoId}",
+                "title": video.snippet.title,
+                "description": video.snippet.description,
+                "published_date": video.snippet.publishedAt,
+                "thumbnail": video.snippet.thumbnails.default.url,
+                "duration": details[video.id.videoId].contentDetails.duration if video.id.videoId in details else None,
+                "view_count": details[video.id.videoId].statistics.viewCount if video.id.videoId in details else None,
+                "transcript": transcripts.get(video.id.videoId),
+            } for data_id, video in new_videos.items()
+        ]
+
+        published_dates = [video.snippet.publishedAt for video in search_items]
+        if window_newest:
+            published_dates.append(window_newest)
+        if complete and published_dates:
+            _pending_youtube_state.update(
+                published_after=max(published_dates), published_before=None, window_newest=None
+            )
+        elif not complete and search_items:
+            _pending_youtube_state.update(
+                published_before=min(video.snippet.publishedAt for video in search_items),
+                window_newest=max(published_dates),
+            )
+        logger.info(f"Spent {quota.used_this_run} YouTube quota units ({quota.used_today}/{quota.daily_quota} today)")
+
+        logger.debug("Returning video list")
+        return video_list
+    except Exception as e:
+        logger.error(f"Error: {e}")
+    logger.debug("Returning empty list due to error")
+    return []
+
+
+def commit_youtube_state():
+    """
+    Persists the search window of the last YouTube fetch, so the next search starts where it stopped.
+    """
+    if _pending_youtube_state:
+        save_source_state(YOUTUBE_SOURCE, dict(_pending_youtube_state))
+        _pending_youtube_state.clear()
@@ -1,12 +1,17 @@
 import datetime
+import hashlib
+import json
 import os
 import dotenv
 from pymongo import MongoClient, UpdateOne
 from pinecone import Pinecone, ServerlessSpec
-from langchain_pinecone import PineconeVectorStore
 from langchain_core.documents import Document
 from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 
 # Load environment variables
 dotenv.load_dotenv()
@@ -26,8 +31,44 @@ print("Pinecone API key and index name set.")
 # Initialize MongoDB client
 mongo_client = MongoClient(MONGO_URI)
 db = mongo_client['crypt']
-collection = db['youtube_news']
-print("MongoDB client initialized and connected to 'crypto_news' collection.")
+print("MongoDB client initialized.")
+
+# Streaming pipeline sizes
+READ_BATCH_SIZE = 256  # Documents read from MongoDB and marked as embedded together
+EMBED_BATCH_SIZE = 64  # Texts passed to the embedding model at once
+UPSERT_BATCH_SIZE = 100  # Vectors per Pinecone upsert request
+UPSERT_WORKERS = 4  # Concurrent Pinecone upsert requests
+DELETE_BATCH_SIZE = 1000  # Most vector IDs Pinecone accepts per delete request
+QUEUE_SIZE = 4  # Batches read ahead of the embedding worker across all sources
+
+# Chunking, measured in the embedding model's word pieces. all-MiniLM-L6-v2 truncates at 256
+CHUNK_SIZE = 200
+CHUNK_OVERLAP = 40
+
+# How each collection maps onto a document. `content` lists the fields used as the page content in order
+# of preference, `metadata` maps each metadata key to the field it is read from
+EMBEDDING_SOURCES = {
+    "rekt_news": {
+        "content": ["summary"],
+        "metadata": {"title": "title", "link": "link", "published_date": "publication_date"},
+    },
+    "crypto_news": {
+        "content": ["summary"],
+        "metadata": {"title": "title", "link": "link", "published_date": "published"},
+    },
+    "newscatcher_news": {
+        "content": ["content", "description"],
+        "metadata": {"title": "title", "link": "link", "published_date": "published_date", "country": "country"},
+    },
+    "youtube_news": {
+        # Transcripts make the spoken content searchable, the description is the fallback
+        "content": ["transcript", "description"],
+        "metadata": {
+            "title": "title", "link": "video_url", "video_url": "video_url",
+            "channel_title": "channel_title", "published_date": "published_date",
+        },
+    },
+}
 
 # Initialize Pinecone
 pc = Pinecone(api_key=PINECONE_API_KEY)
@@ -37,72 +78,228 @@ print("Pinecone client initialized.")
 embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
 print("HuggingFace embeddings initialized with model 'all-MiniLM-L6-v2'.")
 
+# Splits long content into overlapping chunks the model can embed without truncating
+text_splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+    embeddings.client.tokenizer,
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+)
+
 def check_value(value):
     return value if value is not None else "Information not available"
 
-def create_document(summary):
-    print(f"Creating document for summary with title: {summary.get('title')}")
+def create_document(source, summary):
+    mapping = EMBEDDING_SOURCES[source]
+    content = next((summary[field] for field in mapping["content"] if summary.get(field)), None)
     return Document(
-        page_content=check_value(summary.get('description')),
+        page_content=check_value(content),
         metadata={
-            "channel_title": check_value(summary.get('channel_title')),
-            "video_url": check_value(summary.get('video_url')),
-            "title": check_value(summary.get('title')),
-            "published_date": check_value(summary.get('published_date')),
+            "data_id": summary.get('data_id'),
+            "source": source,
+            **{key: check_value(summary.get(field)) for key, field in mapping["metadata"].items()},
         }
     )
 
-async def process_summaries():
-    print("Fetching summaries without embeddings from MongoDB.")
-    summaries = collection.find({
-        "$or": [
-            {"date_of_embedding": {"$exists": False}},
-            {"date_of_embedding": None}
-        ]
-    })
-
-    documents = [create_document(summary) for summary in summaries]
-    print(f"Created {len(documents)} documents from summaries.")
-
-    if documents:
-        # Create or get the Pinecone index
-        if PINECONE_INDEX_NAME not in pc.list_indexes():
-            print(f"Creating Pinecone index: {PINECONE_INDEX_NAME}")
-            try:
-                pc.create_index(
-                    name=PINECONE_INDEX_NAME,
-                    dimension=384,  # Dimension for all-MiniLM-L6-v2
-                    metric="cosine",
-                    spec=ServerlessSpec(cloud="aws", region="us-east-1"),
-                )
-                print(f"Pinecone index {PINECONE_INDEX_NAME} created.")
-            except Exception as e:
-                print(f"Error creating Pinecone index: {e}")
-        else:
-            print(f"Pinecone index {PINECONE_INDEX_NAME} already exists.")
-
-        # Upload documents to Pinecone
-        print("Uploading documents to Pinecone.")
-        vector_store = await asyncio.to_thread(
-            PineconeVectorStore.from_documents,
-            documents,
-            embeddings,
-            index_name=PINECONE_INDEX_NAME
-        )
-        print(f"Uploaded {len(documents)} documents to Pinecone.")
-
-        # Update MongoDB to mark documents as embedded
-        print("Updating MongoDB to mark documents as embedded.")
-        update_operations = [
-            UpdateOne(
-                {"_id": doc.metadata.get("link")},
-                {"$set": {"date_of_embedding": datetime.datetime.now()}}
+def ensure_index():
+    # Create or get the Pinecone index
+    if PINECONE_INDEX_NAME not in pc.list_indexes().names():
+        print(f"Creating Pinecone index: {PINECONE_INDEX_NAME}")
+        try:
+            pc.create_index(
+                name=PINECONE_INDEX_NAME,
+                dimension=384,  # Dimension for all-MiniLM-L6-v2
+                metric="cosine",
+                spec=ServerlessSpec(cloud="aws", region="us-east-1"),
             )
-            for doc in documents
-        ]
-        await asyncio.to_thread(collection.bulk_write, update_operations)
-        print("Updated MongoDB with embedding dates.")
+            print(f"Pinecone index {PINECONE_INDEX_NAME} created.")
+        except Exception as e:
+            print(f"Error creating Pinecone index: {e}")
     else:
+        print(f"Pinecone index {PINECONE_INDEX_NAME} already exists.")
+
+def content_hash(document):
+    # Changes to the text, the metadata or the chunking mean the stored vector records are stale
+    payload = json.dumps(
+        {"text": document.page_content, "metadata": document.metadata, "chunking": [CHUNK_SIZE, CHUNK_OVERLAP]},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def chunk_document(document):
+    """
+    Splits a document into chunks linked to it by `parent_id`. Chunk IDs are `<data_id>:<chunk_index>`.
+    """
+    chunks = text_splitter.split_text(document.page_content) or [document.page_content]
+    return [
+        Document(
+            page_content=chunk,
+            metadata={
+                **document.metadata,
+                "chunk_id": f"{document.metadata['data_id']}:{chunk_index}",
+                "parent_id": document.metadata["data_id"],
+                "chunk_index": chunk_index,
+                "chunk_count": len(chunks),
+            }
+        )
+        for chunk_index, chunk in enumerate(chunks)
+    ]
+
+def stale_vector_ids(summary, chunk_count):
+    # Vectors stored before chunking used the bare data_id, and a shorter document leaves trailing chunks behind
+    data_id = summary["data_id"]
+    previous_count = summary.get("embedding_chunks", 0)
+    return [data_id] + [f"{data_id}:{chunk_index}" for chunk_index in range(chunk_count, previous_count)]
+
+def read_batches(source):
+    """
+    Streams the summaries of a source without embeddings in `_id` order, READ_BATCH_SIZE at a time.
+
+    Each batch is marked as embedded once it is stored, so an interrupted run resumes with the first
+    batch it had not finished, and a data point whose content changes is picked up again once ingestion
+    clears its `date_of_embedding`.
+    """
+    mapping = EMBEDDING_SOURCES[source]
+    projection = {
+        "data_id": 1, "embedding_hash": 1, "embedding_chunks": 1,
+        **{field: 1 for field in [*mapping["content"], *mapping["metadata"].values()]}
+    }
+    query = {
+        "data_id": {"$type": "string"},  # Only data points carrying the 128-bit content ID
+        "date_of_embedding": None,  # Matches both a missing and a null date
+        "duplicate_of": None,  # Near-duplicates are represented by their canonical article
+    }
+
+    cursor = db[source].find(query, projection).sort("_id", 1).batch_size(READ_BATCH_SIZE)
+    while batch := list(islice(cursor, READ_BATCH_SIZE)):
+        yield batch
+
+def count_tokens(texts):
+    # Tokens actually seen by the model, which truncates at its max sequence length
+    max_length = embeddings.client.max_seq_length
+    return sum(min(len(ids), max_length) for ids in embeddings.client.tokenizer(texts)["input_ids"])
+
+def embed_documents(documents):
+    vectors, tokens = [], 0
+    for start in range(0, len(documents), EMBED_BATCH_SIZE):
+        texts = [doc.page_content for doc in documents[start:start + EMBED_BATCH_SIZE]]
+        vectors.extend(embeddings.embed_documents(texts))
+        tokens += count_tokens(texts)
+    return vectors, tokens
+
+def upsert_vectors(index, documents, vectors, executor):
+    # Vector IDs are the chunk IDs, the text is stored under the key PineconeVectorStore reads
+    records = [
+        (doc.metadata["chunk_id"], vector, {**doc.metadata, "text": doc.page_content})
+        for doc, vector in zip(documents, vectors)
+    ]
+    futures = [
+        executor.submit(index.upsert, vectors=records[start:start + UPSERT_BATCH_SIZE])
+        for start in range(0, len(records), UPSERT_BATCH_SIZE)
+    ]
+    for future in futures:
+        future.result()
+
+def process_batch(index, source, summaries, executor):
+    documents = [create_document(source, summary) for summary in summaries]
+    hashes = [content_hash(document) for document in documents]
+
+    # Only documents whose content differs from what was last embedded are chunked and embedded again
+    chunk_counts = {}
+    chunks, stale_ids = [], []
+    for document, summary, digest in zip(documents, summaries, hashes):
+        if summary.get("embedding_hash") == digest:
+            continue
+        document_chunks = chunk_document(document)
+        chunk_counts[summary["_id"]] = len(document_chunks)
+        chunks.extend(document_chunks)
+        stale_ids.extend(stale_vector_ids(summary, len(document_chunks)))
+
+    vectors, tokens = embed_documents(chunks)
+    upsert_vectors(index, chunks, vectors, executor)
+    for start in range(0, len(stale_ids), DELETE_BATCH_SIZE):
+        index.delete(ids=stale_ids[start:start + DELETE_BATCH_SIZE])
+
+    # Mark the whole batch as embedded, keyed by the MongoDB _id carried through from the read
+    embedded_at = datetime.datetime.now()
+    update_operations = [
+        UpdateOne(
+            {"_id": summary["_id"]},
+            {"$set": {
+                "date_of_embedding": embedded_at,
+                "embedding_hash": digest,
+                "embedding_chunks": chunk_counts.get(summary["_id"], summary.get("embedding_chunks", 0)),
+            }}
+        )
+        for summary, digest in zip(summaries, hashes)
+    ]
+    db[source].bulk_write(update_operations, ordered=False)
+    return len(chunk_counts), tokens
+
+class SourceStats:
+    """Throughput of the embedding job for a single source."""
+
+    def __init__(self):
+        self.documents = 0
+        self.tokens = 0
+        self.seconds = 0.0
+
+    def record(self, documents, tokens, seconds):
+        self.documents += documents
+        self.tokens += tokens
+        self.seconds += seconds
+
+    def __str__(self):
+        seconds = self.seconds or float("inf")
+        return (f"{self.documents} docs, {self.tokens} tokens in {self.seconds:.1f}s "
+                f"({self.documents / seconds:.1f} docs/sec, {self.tokens / seconds:.1f} tokens/sec)")
+
+async def read_source(source, queue):
+    """Feeds the batches of one source into the shared embedding queue."""
+    # Lets the query for summaries without embeddings walk an index in _id order
+    await asyncio.to_thread(db[source].create_index, [("date_of_embedding", 1), ("_id", 1)])
+
+    batches = read_batches(source)
+    while summaries := await asyncio.to_thread(next, batches, None):
+        await queue.put((source, summaries))
+
+async def embedding_worker(queue, index, stats):
+    """
+    Embeds and uploads batches from every source. A single worker keeps the model from being
+    contended while the sources are read concurrently.
+    """
+    with ThreadPoolExecutor(max_workers=UPSERT_WORKERS) as executor:
+        while (item := await queue.get()) is not None:
+            source, summaries = item
+            start = time.perf_counter()
+            documents, tokens = await asyncio.to_thread(process_batch, index, source, summaries, executor)
+            stats[source].record(documents, tokens, time.perf_counter() - start)
+            print(f"{source}: {stats[source]}")
+
+async def process_summaries(sources=None):
+    sources = list(EMBEDDING_SOURCES) if sources is None else sources
+    print(f"Streaming summaries without embeddings from {', '.join(sources)}.")
+    ensure_index()
+    index = pc.Index(PINECONE_INDEX_NAME)
+
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    stats = {source: SourceStats() for source in sources}
+    worker = asyncio.create_task(embedding_worker(queue, index, stats))
+    readers = asyncio.gather(*(read_source(source, queue) for source in sources))
+    try:
+        await asyncio.wait({readers, worker}, return_when=asyncio.FIRST_COMPLETED)
+        if worker.done():
+            worker.result()  # Surfaces the error which stopped the worker instead of blocking the readers
+        await readers
+        await queue.put(None)
+        await worker
+    finally:
+        readers.cancel()
+        worker.cancel()
+
+    for source, source_stats in stats.items():
+        print(f"Embedded {source}: {source_stats}")
+    if not any(source_stats.documents for source_stats in stats.values()):
         print("No new documents to process.")
 
 async def main():